@@ -0,0 +1,81 @@
+"""
+Benchmark regex correction throughput in chars/sec.
+Compares the per-text load_corrections + apply_corrections path main.py used to take, apply_corrections
+with the rules loaded once, and the compiled CorrectionEngine, and checks all three agree.
+
+Run from the project root:
+    python -m benchmarks.bench_corrections [--repeat N]
+"""
+import argparse
+import csv
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from utils.regex_rules import (load_corrections, apply_corrections, CorrectionEngine,
+                               DEFAULT_CORRECTIONS_PATH)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_corpus(seed=0, synthetic_size=5000):
+    """English turns from the raw CSVs, Arabizi from the saved datasets, plus synthetic rule-heavy lines."""
+    texts = []
+    for csv_path in sorted((BASE_DIR / "data/raw").glob("*.csv")):
+        with open(csv_path, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                texts.extend(t.strip() for t in re.split(r"[.!?]+\s+", row["dialog"]) if t.strip())
+    for json_path in sorted((BASE_DIR / "data").rglob("*.json*")):
+        with open(json_path, encoding="utf-8") as f:
+            raw = f.read()
+        texts.extend(re.findall(r'"(?:prompt|response)_(?:arabizi|variant)": "((?:[^"\\]|\\.)*)"', raw))
+
+    rng = random.Random(seed)
+    rule_words = [re.sub(r"\\b|\(.*?\)", "", pattern) for pattern in load_corrections(DEFAULT_CORRECTIONS_PATH)]
+    filler = ["ya", "zalame", "biddak", "7abibi", "3am", "btsir", "w", "enta", "la2", "Kifak", "SHOU"]
+    for _ in range(synthetic_size):
+        words = [rng.choice(rule_words + filler * 3) for _ in range(rng.randint(3, 15))]
+        texts.append(" ".join(w.upper() if rng.random() < 0.1 else w for w in words) + rng.choice(["?", "!", "."]))
+    return texts
+
+
+def run(label, fn, texts, repeat):
+    chars = sum(len(t) for t in texts) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [fn(t) for t in texts]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {chars / elapsed:>14,.0f} chars/sec  ({elapsed:.3f}s)")
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # load_corrections logs on every call
+    texts = load_corpus()
+    print(f"{len(texts)} texts, {sum(len(t) for t in texts):,} chars\n")
+
+    corrections = load_corrections(DEFAULT_CORRECTIONS_PATH)
+    engine = CorrectionEngine(corrections)
+    per_call = run("load_corrections + apply_corrections", lambda t: apply_corrections(
+        t, load_corrections(DEFAULT_CORRECTIONS_PATH)), texts, 1)
+    preloaded = run("apply_corrections (rules loaded once)", lambda t: apply_corrections(t, corrections),
+                    texts, args.repeat)
+    compiled = run("CorrectionEngine.apply", engine.apply, texts, args.repeat)
+
+    mismatches = [(t, a, b) for t, a, b in zip(texts, preloaded, compiled) if a != b]
+    if per_call != preloaded or mismatches:
+        for text, expected, got in mismatches[:10]:
+            print(f"MISMATCH {text!r}: expected {expected!r}, got {got!r}")
+        sys.exit(1)
+    print("\nAll outputs identical.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark the stage file formats: size on disk, write time, streaming read time and peak traced memory
+for the indented JSON array the stages used to hand off, JSONL and Parquet (if pyarrow is installed).
+Records look like final dataset entries, with their variants as a nested list.
+
+Run from the project root:
+    python -m benchmarks.bench_formats [--records N]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from utils.io_utils import RecordWriter, iter_records
+
+WORDS = ["ya", "zalame", "biddak", "7abibi", "3am", "btsir", "w", "enta", "la2", "kifak", "shou", "mnih", "2albi"]
+
+
+def make_record(rng):
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+    return {
+        "prompt": sentence(), "response": sentence(),
+        "prompt_arabizi": sentence(), "response_arabizi": sentence(),
+        "variants": [{"prompt_variant": sentence(), "response_variant": sentence()} for _ in range(3)],
+    }
+
+
+def measure(fn, trace_memory=True):
+    """Run fn once timed, then once more under tracemalloc (which slows it down) for the peak memory."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    if not trace_memory:
+        return result, elapsed, None
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    records = [make_record(rng) for _ in range(args.records)]
+    formats = ["json", "jsonl"]
+    try:
+        import pyarrow  # noqa: F401
+        formats.append("parquet")
+    except ImportError:
+        print("pyarrow not installed, skipping Parquet")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Baseline: what the stages did before, json.load of an indented array
+        legacy_path = os.path.join(tmp, "legacy.json")
+        with open(legacy_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+
+        def legacy_read():
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                return sum(1 for _ in json.load(f))
+        count, read_time, read_peak = measure(legacy_read)
+        print(f"{'format':<14}{'size MB':>10}{'write s':>10}{'read s':>10}{'read peak MB':>14}")
+        print(f"{'json.load':<14}{os.path.getsize(legacy_path) / 1e6:>10.1f}{'':>10}{read_time:>10.2f}"
+              f"{read_peak / 1e6:>14.1f}")
+
+        for fmt in formats:
+            path = os.path.join(tmp, f"records.{fmt}")
+
+            def write():
+                with RecordWriter(path) as writer:
+                    for record in records:
+                        writer.write(record)
+            _, write_time, _ = measure(write, trace_memory=False)
+            count, read_time, read_peak = measure(lambda: sum(1 for _ in iter_records(path)))
+            assert count == len(records)
+            print(f"{fmt:<14}{os.path.getsize(path) / 1e6:>10.1f}{write_time:>10.2f}{read_time:>10.2f}"
+                  f"{read_peak / 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
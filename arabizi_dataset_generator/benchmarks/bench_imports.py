@@ -0,0 +1,76 @@
+"""
+Import-time benchmark: the cold-start cost of the pipeline's entry points and of what a worker process
+loads (utils.postprocess; with the spawn start method a worker also re-imports main.py). Every module is
+imported in a fresh interpreter, several times, and the median import time and process wall time are
+reported with the heavy dependencies the import pulled in. A regex/variant-only import should load
+neither the openai SDK nor its HTTP stack.
+
+Run from the project root:
+    python -m benchmarks.bench_imports [--modules main utils.postprocess ...] [--repeat 5] [--output FILE]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MODULES = ["main", "utils.postprocess", "utils.regex_rules", "utils.variant_rules", "utils.arabizi_scorer",
+           "utils.gpt_api", "scripts.1_preprocess", "scripts.2_translate_gpt", "scripts.3_postprocess_regex",
+           "scripts.4_generate_variants"]
+HEAVY_MODULES = ["openai", "httpx", "pandas", "numpy", "tqdm", "sqlite3", "cProfile"]
+
+_CHILD = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+def time_import(module, workdir, env):
+    """Import module in a fresh interpreter. Returns its import seconds, process seconds and heavy modules loaded."""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", _CHILD, module, *HEAVY_MODULES], cwd=workdir, env=env,
+                             capture_output=True, text=True, encoding="utf-8")
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-3000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return result["seconds"], wall, result["loaded"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(BASE_DIR), os.getenv("PYTHONPATH")])))
+    results = []
+    # main.py creates its log directory on import, so the children run in a scratch directory
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = statistics.median(time_import("json", tmp, env)[1] for _ in range(args.repeat))
+        print(f"Interpreter start-up: {baseline * 1000:.0f} ms")
+        print(f"{'module':<30}{'import ms':>10}{'process ms':>12}  heavy modules loaded")
+        for module in args.modules:
+            runs = [time_import(module, tmp, env) for _ in range(args.repeat)]
+            result = {"module": module, "import_ms": round(statistics.median(run[0] for run in runs) * 1000, 1),
+                      "process_ms": round(statistics.median(run[1] for run in runs) * 1000, 1),
+                      "loaded": runs[-1][2]}
+            results.append(result)
+            print(f"{module:<30}{result['import_ms']:>10.1f}{result['process_ms']:>12.1f}  "
+                  f"{', '.join(result['loaded']) or '-'}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"startup_ms": round(baseline * 1000, 1), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+End-to-end throughput benchmark of main.main() and the scripts/ stages against the local mock Azure
+OpenAI server (utils/mock_azure.py), so it spends no quota. For every dataset size it writes a DailyDialog
+sample with that many pairs, runs each target on it and reports pairs/sec, p50/p99 client-side latency
+of the chat calls (api.call_s: breaker and rate limiter waits, retries and back-offs included), peak RSS
+and API calls per pair.
+
+Every target runs in a fresh process, so peak RSS is its own, with the translation cache off and the
+rate limits raised (--rpm, --tpm) so the numbers measure the pipeline rather than the quota. The stages
+run in order on the same sample, each reading the previous one's output; stages before a selected one
+run too, unreported. Keep a baseline with --output and compare later runs against it to catch regressions.
+
+Run from the project root:
+    python -m benchmarks.bench_pipeline [--sizes 100 500 2000] [--targets main 1_preprocess ...]
+        [--mode pair] [--latency 0.05] [--rate-limit-rate 0.02] [--content-filter-rate 0.01] [--output FILE]
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.io_utils import iter_records, stage_path
+from utils.metrics import get_metrics
+from utils.mock_azure import MockAzureServer
+from utils.preprocessing import dialog_turn_lists
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STAGE_OUTPUTS = {
+    "1_preprocess": "translated/preprocessed.json",
+    "2_translate_gpt": "translated/translated1.json",
+    "3_postprocess_regex": "corrected/Regex_cleaned.json",
+    "4_generate_variants": "final/arabizi_dataset.json",
+}
+TARGETS = ["main", *STAGE_OUTPUTS]
+
+
+def write_sample(path, size):
+    """
+    Write the first dialogs of data/raw/*.csv to path, enough for `size` pairs when turns are paired
+    two by two like scripts/1_preprocess.py does (and more when paired turn by turn, as main.py does).
+    Dialogs are repeated if the CSVs are too small; main.py translates repeats only once.
+    """
+    csv_paths = sorted((BASE_DIR / "data/raw").glob("*.csv"))
+    df = pd.concat([pd.read_csv(csv_path, usecols=["dialog"]) for csv_path in csv_paths], ignore_index=True)
+    pairs = pd.Series([len(turns) // 2 for turns in dialog_turn_lists(df)])
+    repeats = -(-size // max(int(pairs.sum()), 1))
+    df = pd.concat([df] * repeats, ignore_index=True)
+    rows = int((pd.concat([pairs] * repeats, ignore_index=True).cumsum() < size).sum()) + 1
+    os.makedirs(Path(path).parent, exist_ok=True)
+    df.head(rows).to_csv(path, index=False)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_target(target, size, workdir, mode=None):
+    """
+    Run one target on the sample in workdir, in this process. Returns its pairs, seconds, peak RSS and
+    the p50/p99 of its chat calls as the client saw them.
+    """
+    data_dir = Path(workdir) / "data"
+    if target == "main":
+        import main
+        main.INPUT_PATH = data_dir / "raw" / "train.csv"
+        main.OUTPUT_PATH = data_dir / "final" / "bench_main.jsonl"
+        main.SKIPPED_PATH = data_dir / "corrected" / "skipped_main.jsonl"
+        main.NUM_ENTRIES, main.ENTRY_OFFSET, main.RESUME = size, 0, False
+        main.TRANSLATION_MODE = mode or main.TRANSLATION_MODE
+        start = time.perf_counter()
+        main.main()
+        output_path = main.OUTPUT_PATH
+    else:
+        stage = importlib.import_module(f"scripts.{target}")
+        kwargs = {"limit": None} if target == "2_translate_gpt" else {}
+        start = time.perf_counter()
+        stage.main(force=True, data_dir=str(data_dir), **kwargs)
+        output_path = stage_path(data_dir / STAGE_OUTPUTS[target])
+    seconds = time.perf_counter() - start
+    pairs = sum(1 for _ in iter_records(output_path)) if os.path.exists(output_path) else 0
+    calls = get_metrics().histograms.get("api.call_s")
+    return {"pairs": pairs, "seconds": seconds, "peak_rss": peak_rss(),
+            "p50": calls.quantile(0.5) if calls else None, "p99": calls.quantile(0.99) if calls else None}
+
+
+def run_isolated(target, size, workdir, mode, server, env):
+    """Run a target in a child process and add the number of requests the mock received to the result."""
+    mock = server.mock
+    calls = mock.requests
+    command = [sys.executable, "-m", "benchmarks.bench_pipeline", "--run", target, "--sizes", str(size),
+               "--workdir", str(workdir)] + (["--mode", mode] if mode else [])
+    # main.py logs next to its hard-coded BASE_DIR, so the child runs in the scratch directory
+    process = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, encoding="utf-8")
+    if process.returncode != 0:
+        raise RuntimeError(f"{target} failed on {size} pairs:\n{process.stderr[-3000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result.update(target=target, size=size, calls=mock.requests - calls)
+    return result
+
+
+def print_result(result):
+    def ms(value):
+        return f"{value * 1000:.1f}" if value is not None else "-"
+    pairs = result["pairs"]
+    rss = f"{result['peak_rss'] / 1e6:.0f}" if result["peak_rss"] is not None else "-"
+    calls_per_pair = f"{result['calls'] / pairs:.3f}" if pairs else "-"
+    print(f"{result['size']:>7}{result['target']:>22}{pairs:>8}{pairs / result['seconds']:>11.1f}"
+          f"{ms(result['p50']):>9}{ms(result['p99']):>9}{rss:>9}{calls_per_pair:>11}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000], help="pairs per sample")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--mode", choices=["pair", "dialog", "packed", "batch_job"],
+                        help="main.py's TRANSLATION_MODE (default: its own)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds the mock takes per chat request")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of chat requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--content-filter-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=100000, help="AZURE_OPENAI_RPM of the runs")
+    parser.add_argument("--tpm", type=int, default=100000000, help="AZURE_OPENAI_TPM of the runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--run", choices=TARGETS, help=argparse.SUPPRESS)  # Child process: run one target
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        result = run_target(args.run, args.sizes[0], args.workdir, args.mode)
+        print(json.dumps(result))
+        return
+
+    server = MockAzureServer(batch_seconds=0.2, latency=args.latency, jitter=args.jitter,
+                             rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                             content_filter_rate=args.content_filter_rate)
+    results = []
+    with server, tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, AZURE_OPENAI_ENDPOINT=server.url, AZURE_OPENAI_API_KEY="mock",
+                   AZURE_OPENAI_RPM=str(args.rpm), AZURE_OPENAI_TPM=str(args.tpm), ARABIZI_CACHE_PATH="",
+                   ARABIZI_ENDPOINTS_PATH=os.path.join(tmp, "no-endpoints.json"),
+                   ARABIZI_SKIPPED_PATH=os.path.join(tmp, "skipped_filtered.jsonl"),
+                   ARABIZI_BATCH_DIR=os.path.join(tmp, "batch"), ARABIZI_BATCH_POLL_INTERVAL="0.1",
+                   ARABIZI_METRICS_DIR=os.path.join(tmp, "metrics"),
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(BASE_DIR), os.getenv("PYTHONPATH")])))
+        print(f"{'size':>7}{'target':>22}{'pairs':>8}{'pairs/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'RSS MB':>9}"
+              f"{'calls/pair':>11}")
+        stages = list(STAGE_OUTPUTS)
+        last_stage = max((stages.index(target) for target in args.targets if target in stages), default=-1)
+        runs = (["main"] if "main" in args.targets else []) + stages[:last_stage + 1]
+        for size in args.sizes:
+            workdir = Path(tmp) / str(size)
+            write_sample(workdir / "data" / "raw" / "train.csv", size)
+            for target in runs:
+                result = run_isolated(target, size, workdir, args.mode, server, env)
+                if target in args.targets:
+                    results.append(result)
+                    print_result(result)
+    print(f"Mock: {server.mock.requests} requests, {server.mock.rate_limited} rate limited, "
+          f"{server.mock.filtered} content filtered")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("run", "workdir", "output")},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
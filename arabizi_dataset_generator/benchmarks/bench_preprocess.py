@@ -0,0 +1,92 @@
+"""
+Benchmark DailyDialog preprocessing: the row-by-row iterrows() implementation main.py used to have
+against the vectorized utils.preprocessing path, on the bundled CSVs and on a synthetic large file.
+Outputs of both implementations are compared on every input they both run on.
+
+Run from the project root:
+    python -m benchmarks.bench_preprocess [--synthetic-dialogs N] [--legacy-synthetic]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from utils.preprocessing import preprocess_dialogs
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def clean_text(text):
+    return re.sub(r"[^\w\s.,!?']", '', text).strip()
+
+
+def split_dialog(dialog):
+    if isinstance(dialog, list):
+        return [clean_text(turn) for turn in dialog if clean_text(turn)]
+    dialog = re.sub(r'[.!?]+\s+', '||', dialog)
+    return [clean_text(turn) for turn in dialog.split('||') if clean_text(turn)]
+
+
+def legacy_preprocess(df):
+    """The previous main.preprocess_dataset: iterrows() and clean_text twice per turn."""
+    prompts, responses = [], []
+    for _, row in df.iterrows():
+        try:
+            turns = split_dialog(row['dialog'])
+        except Exception:
+            continue
+        for i in range(len(turns) - 1):
+            if turns[i] and turns[i + 1]:
+                prompts.append(turns[i])
+                responses.append(turns[i + 1])
+    return pd.DataFrame({'prompt': prompts, 'response': responses})
+
+
+def write_synthetic_csv(num_dialogs, path):
+    """Write num_dialogs dialogs sampled (with replacement) from the bundled CSVs."""
+    source = pd.concat([pd.read_csv(p) for p in sorted((BASE_DIR / "data/raw").glob("*.csv"))])
+    source.sample(n=num_dialogs, replace=True, random_state=0).to_csv(path, index=False)
+
+
+def timed(label, fn, path):
+    start = time.perf_counter()
+    pairs = fn(pd.read_csv(path))
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12} {elapsed:8.2f}s  {len(pairs):>10,} pairs  {len(pairs) / elapsed:>12,.0f} pairs/sec")
+    return pairs
+
+
+def bench_file(path, run_legacy=True):
+    print(f"{path.name} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    vectorized = timed("vectorized", preprocess_dialogs, path)
+    if run_legacy:
+        legacy = timed("iterrows", legacy_preprocess, path)
+        if not legacy.equals(vectorized):
+            print("  MISMATCH between iterrows and vectorized output")
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--synthetic-dialogs", type=int, default=1_000_000)
+    parser.add_argument("--legacy-synthetic", action="store_true",
+                        help="also run the slow iterrows implementation on the synthetic file")
+    args = parser.parse_args()
+
+    ok = all([bench_file(path) for path in sorted((BASE_DIR / "data/raw").glob("*.csv"))])  # Check every file
+    if args.synthetic_dialogs:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / f"synthetic_{args.synthetic_dialogs}.csv"
+            write_synthetic_csv(args.synthetic_dialogs, path)
+            ok = bench_file(path, run_legacy=args.legacy_synthetic) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Check that variant generation is reproducible across processes.
+Generates variants for the Arabizi lines in the saved datasets in several fresh interpreters, each with
+a different PYTHONHASHSEED, and in spawned process-pool workers, then compares digests of the output.
+Exits with status 1 if any run disagrees.
+
+Run from the project root:
+    python -m benchmarks.check_seeding [--runs N] [--run-seed S]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from utils.variant_rules import generate_variants, variant_seed
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_pairs(limit=2000):
+    """Arabizi prompt-response pairs from the saved datasets, plus a few fixed ones."""
+    pairs = [("kifak ya zalame", "mnih, shou 3am ta3mol?"), ("7abibi 2albi", "khalas ghalat")]
+    for json_path in sorted((BASE_DIR / "data").rglob("*.json*")):
+        with open(json_path, encoding="utf-8") as f:
+            raw = f.read()
+        pairs.extend(re.findall(r'"prompt_arabizi": "((?:[^"\\]|\\.)*)",\s*"response_arabizi": "((?:[^"\\]|\\.)*)"',
+                                raw))
+    return pairs[:limit]
+
+
+def digest_variants(pairs, run_seed, num_variants=3):
+    """SHA-256 over the variants of every pair, seeded the way main.py seeds them."""
+    digest = hashlib.sha256()
+    for prompt, response in pairs:
+        seed = variant_seed(prompt, response, run_seed)
+        variants = generate_variants(prompt, num_variants, seed=seed) + generate_variants(response, num_variants, seed=seed)
+        digest.update(json.dumps(variants, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to compare")
+    parser.add_argument("--run-seed", type=int, default=0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    pairs = load_pairs()
+    if args.child:
+        print(digest_variants(pairs, args.run_seed))
+        return
+
+    expected = digest_variants(pairs, args.run_seed)
+    results = {"this process": expected}
+    for run in range(args.runs):
+        env = {**os.environ, "PYTHONHASHSEED": str(run + 1)}
+        output = subprocess.run([sys.executable, "-m", "benchmarks.check_seeding", "--child",
+                                 "--run-seed", str(args.run_seed)],
+                                cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+        results[f"PYTHONHASHSEED={run + 1}"] = output.strip()
+
+    chunks = [pairs[i::4] for i in range(4)]
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        worker_digests = list(pool.map(digest_variants, chunks, [args.run_seed] * len(chunks)))
+    results["spawned workers"] = all(d == digest_variants(c, args.run_seed)
+                                     for c, d in zip(chunks, worker_digests)) and expected
+
+    print(f"{len(pairs)} pairs, run seed {args.run_seed}")
+    for name, digest in results.items():
+        print(f"  {name:<20} {digest or 'MISMATCH'}")
+    if any(digest != expected for digest in results.values()):
+        print("Variant generation is NOT reproducible across processes")
+        sys.exit(1)
+    print("Variant generation is reproducible across processes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
-import json
+import argparse
 import os
+import sys
 import logging
-import time
-import re
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import OrderedDict
+from functools import partial
+from itertools import repeat
 from pathlib import Path
-import pandas as pd
-from utils.gpt_api import translate_with_gpt
-from utils.regex_rules import load_corrections, apply_corrections, validate_arabizi
-from utils.variant_rules import generate_variants
+from utils.concurrency import ordered_submit, chunked
+from utils.checkpoint import ResumableWriter, entry_key
+from utils.skipped_sink import (get_sink, log_summaries, ERROR_VALIDATION, ERROR_INVALID_VARIANT, ERROR_MISSING_KEY,
+                                ERROR_UNEXPECTED)
+from utils.dedup import Deduplicator, MAX_GROUPS
+from utils.gpt_api import (translate_with_gpt, translate_dialog, translate_batch, translate_with_batch_job, get_cache,
+                           get_pool, BATCH_MAX_PAIRS)
+from utils.postprocess import init_worker, postprocess_chunk, postprocess_chunk_in_worker
+from utils.metrics import get_metrics, instrumented_stage
+from utils.variant_rules import VARIANT_MODE
+from utils.sharding import (shard_of, shard_path, write_shard_manifest, is_shard_complete, merge_shards, Claim,
+                            claim_path, run_digests, ShardMergeError)
 
 
 def setup_logging():
@@ -35,66 +45,54 @@ BASE_DIR = Path("D:/code-X_internship/arabizi_dataset_generator")
 INPUT_PATH = BASE_DIR / "data/raw/test.csv"
 OUTPUT_PATH = BASE_DIR / "data/final/arabizi_dataset_testcsv.jsonl"
 SKIPPED_PATH = BASE_DIR / "corrected/skipped_entries1.jsonl"
-NUM_ENTRIES = 15
-NUM_VARIANTS = 3
+NUM_ENTRIES = 15  # Prompt-response pairs to process; None for the whole file
+ENTRY_OFFSET = 0  # Index of the first pair to process
+NUM_VARIANTS = 3  # Per pair
 USE_GPT = True
-API_DELAY = 2  # Seconds between GPT calls
-
-
-def clean_text(text):
-    """Clean text by removing unwanted characters and stripping whitespace."""
-    return re.sub(r"[^\w\s.,!?']", '', text).strip()
-
-
-def split_dialog(dialog):
-    """Split dialog into turns based on punctuation or other delimiters."""
-    if isinstance(dialog, list):
-        return [clean_text(turn) for turn in dialog if clean_text(turn)]
-    dialog = re.sub(r'[.!?]+\s+', '||', dialog)
-    turns = [clean_text(turn) for turn in dialog.split('||') if clean_text(turn)]
-    return turns
-
-
-def preprocess_dataset(df):
-    """Preprocess DataFrame to extract prompt-response pairs."""
-    prompts = []
-    responses = []
-
-    for _, row in df.iterrows():
-        try:
-            dialog_turns = split_dialog(row['dialog'])
-            # Pair all consecutive turns, handling odd lengths
-            for i in range(len(dialog_turns) - 1):
-                prompt = dialog_turns[i]
-                response = dialog_turns[i + 1]
-                if prompt and response:  # Skip empty turns
-                    prompts.append(prompt)
-                    responses.append(response)
-        except KeyError as e:
-            logger.error(f"Missing 'dialog' column in row: {e}")
-            continue
-        except Exception as e:
-            logger.error(f"Error processing dialog: {e}")
-            continue
-
-    processed_df = pd.DataFrame({'prompt': prompts, 'response': responses})
-    return processed_df
+MAX_CONCURRENCY = 8  # GPT requests in flight at once
+TRANSLATION_MODE = "dialog"  # "dialog", "packed", "pair" or "batch_job"
+RESUME = True  # Continue from OUTPUT_PATH's checkpoint
+NUM_WORKERS = 1  # Processes for correction, validation and variants
+CPU_CHUNK_SIZE = 64  # Entries sent to a worker process at a time
+RUN_SEED = 0  # Mixed into every variant seed
+DEDUP_MODE = "exact"  # Translate duplicates once: None, "exact" or "near"
+NUM_SHARDS = 1  # Shards the input is split into (see utils/sharding.py)
+SHARD_INDEX = None  # Shard this run covers when NUM_SHARDS > 1
+
+
+def pair_turns(turns):
+    """Pair all consecutive turns of a dialog into prompt-response records."""
+    return [{"prompt": prompt, "response": response}
+            for prompt, response in zip(turns, turns[1:]) if prompt and response]
+
+
+def load_dataset(file_path, as_dialogs=False, offset=0, limit=None):
+    """
+    Stream preprocessed records from a CSV, reading only as much of it as the offset/limit window needs.
+    Returns an iterator of prompt-response records, or of dialog turn lists (trimmed to the window's
+    consecutive pairs) when as_dialogs is True.
+    """
+    # pandas is only needed to read the CSV, not by worker processes that import this module
+    from utils.preprocessing import iter_pairs, iter_dialog_turns
+    file_path = Path(file_path)
+    if file_path.suffix != '.csv':
+        raise ValueError(f"Unsupported file format: {file_path.suffix}")
+    if not file_path.exists():
+        logger.error(f"File not found: {file_path}")
+        raise FileNotFoundError(file_path)
+    if as_dialogs:
+        records = iter_dialog_turns(file_path, offset=offset, limit=limit)
+    else:
+        records = iter_pairs(file_path, offset=offset, limit=limit)
+    return _logged_records(records, file_path)
 
 
-def load_dataset(file_path):
-    """Load and preprocess dataset from CSV."""
-    file_path = Path(file_path)
+def _logged_records(records, file_path):
+    """Log errors raised while the dataset is being streamed, as load_dataset did when loading it at once."""
+    from pandas.errors import ParserError
     try:
-        if file_path.suffix == '.csv':
-            df = pd.read_csv(file_path)
-            processed_df = preprocess_dataset(df)
-            return processed_df.to_dict(orient='records')
-        else:
-            raise ValueError(f"Unsupported file format: {file_path.suffix}")
-    except FileNotFoundError:
-        logger.error(f"File not found: {file_path}")
-        raise
-    except pd.errors.ParserError:
+        yield from records
+    except ParserError:
         logger.error(f"Invalid CSV format: {file_path}")
         raise
     except Exception as e:
@@ -102,143 +100,377 @@ def load_dataset(file_path):
         raise
 
 
-def save_dataset(data, file_path):
-    """Save dataset to JSONL file."""
-    file_path = Path(file_path)
-    os.makedirs(file_path.parent, exist_ok=True)
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for item in data:
-            json.dump(item, f, ensure_ascii=False)
-            f.write("\n")
-
-
-def apply_regex_corrections(text):
-    """Apply regex corrections to text."""
-    try:
-        corrections = load_corrections()
-        return apply_corrections(text, corrections).strip()
-    except Exception as e:
-        logger.error(f"Correction failed for text='{text}': {e}")
-        return text
+def translate_entry(item):
+    """Translate one prompt-response pair to Arabizi."""
+    prompt_en = item.get("prompt")
+    response_en = item.get("response")
+    if not (prompt_en and response_en):
+        raise ValueError("Empty or missing prompt/response")
+    if USE_GPT:
+        with get_metrics().timer("translate.pair", records=1):
+            return translate_with_gpt(prompt_en, response_en)
+    logger.debug("Skipped GPT translation for testing")
+    return "kifak?", "mnih, merci"
+
+
+def translate_dialog_entry(turns):
+    """
+    Translate every turn of a dialog once and pair the translated turns.
+    Falls back to pair-by-pair translation if the dialog request fails.
+    Returns one (prompt_arabizi, response_arabizi) tuple per pair from pair_turns(turns).
+    """
+    pairs = pair_turns(turns)
+    if not USE_GPT:
+        return [translate_entry(item) for item in pairs]
+    with get_metrics().timer("translate.dialog", records=len(pairs)):
+        translated = translate_dialog(turns)
+    if translated is None:
+        logger.warning("Content filter rejected the dialog; translating its pairs one by one")
+        return [translate_entry(item) for item in pairs]
+    return [(prompt_arabizi, response_arabizi)
+            for (prompt, response), (prompt_arabizi, response_arabizi)
+            in zip(zip(turns, turns[1:]), zip(translated, translated[1:])) if prompt and response]
+
+
+def translate_packed_entry(items, translate=translate_batch):
+    """
+    Translate a chunk of prompt-response pairs with packed requests, or with another function
+    translating a list of pairs, such as translate_with_batch_job.
+    Returns one translation tuple, or the ValueError for an invalid item, per item.
+    """
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if item.get("prompt") and item.get("response"):
+            valid.append(index)
+        else:
+            results[index] = ValueError("Empty or missing prompt/response")
+    if USE_GPT:
+        with get_metrics().timer(f"translate.{TRANSLATION_MODE}", records=len(valid)):
+            translations = translate([(items[index]["prompt"], items[index]["response"]) for index in valid])
+    else:
+        translations = [translate_entry(items[index]) for index in valid]
+    for index, translation in zip(valid, translations):
+        results[index] = translation
+    return results
+
+
+def iter_units(data, completed=(), start=0, dedup=None, shard=None):
+    """
+    Yield (unit, keys, group, is_new) for every dialog or pair of this shard with pairs left to do: keys are
+    its pairs' checkpoint keys, numbered from start; group and is_new come from dedup (None, True without).
+    """
+    index = start
+    for unit in data:
+        items = pair_turns(unit) if TRANSLATION_MODE == "dialog" else [unit]
+        texts = unit if TRANSLATION_MODE == "dialog" else [unit.get("prompt"), unit.get("response")]
+        first, index = index, index + len(items)
+        if shard is not None and shard_of(texts, shard[1]) != shard[0]:
+            continue
+        keys = [entry_key(first + offset, item) for offset, item in enumerate(items)]
+        if all(key in completed for key in keys):
+            continue
+        if dedup is None:
+            yield unit, keys, None, True
+        else:
+            yield (unit, keys, *dedup.add(texts))
 
 
-def generate_orthographic_variants(text, num_variants, seed=None):
-    """Generate orthographic variants of Arabizi text."""
-    try:
-        return generate_variants(text, num_variants, seed=seed)
-    except TypeError:
-        logger.warning("generate_variants does not support num_variants/seed; using defaults")
-        return generate_variants(text)[:num_variants]
-    except Exception as e:
-        logger.error(f"Variant generation failed for text='{text}': {e}")
-        return [text] * num_variants
+def iter_translations(executor, units, max_groups=MAX_GROUPS):
+    """
+    Translate the units from iter_units() in TRANSLATION_MODE; duplicates reuse their group's outcome.
+    Yields (key, item, translation, error) per prompt-response pair in input order.
+    """
+    outcomes = OrderedDict()  # Group -> outcome of its representative, least recently seen first
 
+    def outcome(group, is_new, result):
+        if group is None:
+            return result
+        if is_new:
+            outcomes[group] = result
+        else:
+            outcomes.move_to_end(group)
+            result = outcomes[group]
+        if len(outcomes) > max_groups:
+            outcomes.popitem(last=False)
+        return result
+
+    if TRANSLATION_MODE == "dialog":
+        submitted = ordered_submit(executor, lambda unit: translate_dialog_entry(unit[0]) if unit[3] else None,
+                                   units, MAX_CONCURRENCY * 2)
+        for (turns, keys, group, is_new), future in submitted:
+            items = pair_turns(turns)
+            try:
+                result = future.result(), None
+            except Exception as e:
+                result = [None] * len(items), e
+            translations, error = outcome(group, is_new, result)
+            for key, item, translation in zip(keys, items, translations):
+                yield key, item, translation, error
+    elif TRANSLATION_MODE in ("packed", "batch_job"):
+        if TRANSLATION_MODE == "packed":
+            # Chunks hold BATCH_MAX_PAIRS representatives, plus the duplicates between them
+            chunks = chunked(units, BATCH_MAX_PAIRS, counts=lambda unit: unit[3])
+            translate = translate_batch
+        else:
+            # A single chunk: the whole window is read, then its pairs go into one job
+            chunks = [list(units)]
+            translate = translate_with_batch_job
+        submitted = ordered_submit(executor,
+                                   lambda chunk: translate_packed_entry([unit[0] for unit in chunk if unit[3]],
+                                                                        translate),
+                                   chunks, MAX_CONCURRENCY * 2)
+        for chunk, future in submitted:
+            try:
+                results = iter(future.result())
+            except Exception as e:
+                results = repeat(e)
+            for item, keys, group, is_new in chunk:
+                result = outcome(group, is_new, next(results) if is_new else None)
+                if isinstance(result, Exception):
+                    yield keys[0], item, None, result
+                else:
+                    yield keys[0], item, result, None
+    else:
+        submitted = ordered_submit(executor, lambda unit: translate_entry(unit[0]) if unit[3] else None,
+                                   units, MAX_CONCURRENCY * 2)
+        for (item, keys, group, is_new), future in submitted:
+            try:
+                result = future.result(), None
+            except Exception as e:
+                result = None, e
+            yield (keys[0], item, *outcome(group, is_new, result))
+
+
+def iter_postprocessed(translations, pool=None):
+    """
+    Correct, validate and vary translations in CPU_CHUNK_SIZE chunks, in pool's workers if given.
+    Yields (key, item, line, invalid_variants, error) in input order.
+    """
+    def prepare(chunk):
+        return [(item, translation) for _, item, translation, error in chunk if error is None]
+
+    chunks = chunked(translations, CPU_CHUNK_SIZE)
+    if pool is None:
+        process = partial(postprocess_chunk, num_variants=NUM_VARIANTS, run_seed=RUN_SEED)
+        processed = ((chunk, process(prepare(chunk))) for chunk in chunks)
+    else:
+        # Workers send back the metrics they recorded along with each chunk's results
+        process = partial(postprocess_chunk_in_worker, num_variants=NUM_VARIANTS, run_seed=RUN_SEED)
+        processed = ordered_submit(pool, process, chunks, NUM_WORKERS * 2, prepare=prepare)
+    for chunk, results in processed:
+        try:
+            if pool is not None:
+                results, worker_metrics = results.result()
+                get_metrics().merge(worker_metrics)
+            results = iter(results)
+        except Exception as e:
+            # The worker died; fail the chunk rather than the whole run
+            results = iter([(None, [], RuntimeError(f"Worker failed: {e}"))] * len(chunk))
+        for key, item, translation, error in chunk:
+            if error is not None:
+                yield key, item, None, [], error
+            else:
+                yield (key, item, *next(results))
+
+
+def run_params():
+    """Settings that decide which records a run writes; shards are only merged with shards run with the same."""
+    return {"mode": TRANSLATION_MODE, "offset": ENTRY_OFFSET, "entries": NUM_ENTRIES, "variants": NUM_VARIANTS,
+            "run_seed": RUN_SEED, "variant_mode": VARIANT_MODE, "use_gpt": USE_GPT}
+
+
+@instrumented_stage("main")
+def main(shard_index=None, num_shards=None):
+    """
+    Translate, correct and vary the input window into OUTPUT_PATH, or only shard shard_index of
+    num_shards (by default SHARD_INDEX of NUM_SHARDS) into its shard files.
+    """
+    from tqdm import tqdm
+
+    shard_index = SHARD_INDEX if shard_index is None else shard_index
+    num_shards = num_shards or NUM_SHARDS
+    shard = None
+    output_path, skipped_path = OUTPUT_PATH, SKIPPED_PATH
+    if num_shards > 1:
+        if shard_index is None or not 0 <= shard_index < num_shards:
+            raise ValueError(f"Shard index {shard_index} is not one of {num_shards} shards")
+        shard = (shard_index, num_shards)
+        output_path, skipped_path = shard_path(OUTPUT_PATH, shard_index), shard_path(SKIPPED_PATH, shard_index)
+        logger.info(f"Running shard {shard_index} of {num_shards} into {output_path}")
 
-def main():
     # Ensure output directories exist
-    for path in [OUTPUT_PATH.parent, SKIPPED_PATH.parent]:
+    for path in [output_path.parent, skipped_path.parent]:
         os.makedirs(path, exist_ok=True)
 
     # Step 1: Load and preprocess
     logger.info("Loading and preprocessing dataset...")
     try:
-        data = load_dataset(INPUT_PATH)
-        data = data[:NUM_ENTRIES]
-        logger.info(f"Loaded {len(data)} prompt-response pairs from {INPUT_PATH}")
+        data = load_dataset(INPUT_PATH, as_dialogs=TRANSLATION_MODE == "dialog", offset=ENTRY_OFFSET,
+                            limit=NUM_ENTRIES)
     except Exception as e:
         logger.error(f"Failed to load dataset: {e}")
         return
+    window = f"{NUM_ENTRIES} pairs" if NUM_ENTRIES is not None else "all pairs"
+    logger.info(f"Streaming {window} from {INPUT_PATH}, starting at pair {ENTRY_OFFSET}")
 
-    final_data = []
+    processed_count = 0
     skipped_count = 0
+    retry_count = 0
+    skipped = get_sink(skipped_path)
+
+    # Records are streamed to output_path; an interrupted run picks up where it stopped
+    writer = ResumableWriter(output_path, resume=RESUME)
+    completed = writer.completed
+
+    # Step 2: Translation runs concurrently; results are consumed in input order
+    executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    dedup = Deduplicator(near_duplicates=DEDUP_MODE == "near") if DEDUP_MODE else None
+    translations = iter_translations(executor, iter_units(data, completed, start=ENTRY_OFFSET, dedup=dedup,
+                                                          shard=shard),
+                                     max_groups=dedup.max_groups if dedup else MAX_GROUPS)
+    # Pairs finished in an earlier run can still come back with the rest of their dialog
+    translations = (entry for entry in translations if entry[0] not in completed)
+
+    # Steps 3 and 4: correction, validation and variants, in worker processes if NUM_WORKERS > 1
+    pool = ProcessPoolExecutor(max_workers=NUM_WORKERS, initializer=init_worker) if NUM_WORKERS > 1 else None
+    outcomes = iter_postprocessed(translations, pool)
+    initial = len(completed) if NUM_ENTRIES is None else min(len(completed), NUM_ENTRIES)
+    progress = tqdm(outcomes, total=NUM_ENTRIES if shard is None else None, initial=initial,
+                    desc="Processing entries")
 
-    for item in tqdm(data, desc="Processing entries"):
-        try:
-            prompt_en = item.get("prompt")
-            response_en = item.get("response")
-            if not (prompt_en and response_en):
-                raise ValueError("Empty or missing prompt/response")
-
-            # Step 2: Translation
-            if USE_GPT:
-                try:
-                    prompt_arabizi, response_arabizi = translate_with_gpt(prompt_en, response_en)
-                    time.sleep(API_DELAY)
-                except Exception as e:
-                    logger.error(f"Translation failed for prompt='{prompt_en}': {e}")
-                    raise
-            else:
-                prompt_arabizi, response_arabizi = "kifak?", "mnih, merci"
-                logger.debug("Skipped GPT translation for testing")
-
-            # Step 3: Regex correction
-            prompt_arabizi = apply_regex_corrections(prompt_arabizi)
-            response_arabizi = apply_regex_corrections(response_arabizi)
-
-            # Validation
-            valid_prompt = validate_arabizi(prompt_arabizi)
-            valid_response = validate_arabizi(response_arabizi)
-            if not (valid_prompt or valid_response):
-                logger.warning(f"Invalid Arabizi: prompt='{prompt_arabizi}', response='{response_arabizi}'")
-                raise ValueError("Both prompt and response are invalid Arabizi")
-
-            # Step 4: Generate variants
-            seed = hash(f"{prompt_arabizi}{response_arabizi}") % 10000
-            prompt_variants = generate_orthographic_variants(prompt_arabizi, NUM_VARIANTS, seed)
-            response_variants = generate_orthographic_variants(response_arabizi, NUM_VARIANTS, seed)
-
-            variants = []
-            for pv, rv in zip(prompt_variants, response_variants):
-                if validate_arabizi(pv) and validate_arabizi(rv):
-                    variants.append({"prompt_variant": pv, "response_variant": rv})
-                else:
-                    logger.warning(f"Invalid variant: prompt='{pv}', response='{rv}'")
-                    with open(SKIPPED_PATH, "a", encoding='utf-8') as f:
-                        json.dump({"prompt_variant": pv, "response_variant": rv, "error": "Invalid Arabizi"},
-                                  f, ensure_ascii=False)
-                        f.write("\n")
-
-            if not variants:
-                variants = [{"prompt_variant": prompt_arabizi, "response_variant": response_arabizi}]
-                logger.warning(f"No valid variants for prompt='{prompt_arabizi}', response='{response_arabizi}'")
-
-            final_data.append({
-                "original": {
-                    "prompt_en": prompt_en,
-                    "response_en": response_en,
-                    "prompt_arabizi": prompt_arabizi,
-                    "response_arabizi": response_arabizi
-                },
-                "variants": variants
-            })
-
-        except ValueError as e:
-            skipped_count += 1
-            logger.error(f"Validation error: {e}")
-            with open(SKIPPED_PATH, "a", encoding='utf-8') as f:
-                json.dump({"item": item, "error": str(e)}, f, ensure_ascii=False)
-                f.write("\n")
-        except KeyError as e:
-            skipped_count += 1
-            logger.error(f"Missing key in entry: {e}")
-            with open(SKIPPED_PATH, "a", encoding='utf-8') as f:
-                json.dump({"item": item, "error": f"Missing key: {e}"}, f, ensure_ascii=False)
-                f.write("\n")
-        except Exception as e:
-            skipped_count += 1
-            logger.error(f"Error processing entry: {e}")
-            with open(SKIPPED_PATH, "a", encoding='utf-8') as f:
-                json.dump({"item": item, "error": str(e)}, f, ensure_ascii=False)
-                f.write("\n")
-
-    # Step 5: Save results
-    logger.info(f"Processed {len(final_data)} entries, skipped {skipped_count}")
     try:
-        save_dataset(final_data, OUTPUT_PATH)
-        logger.info(f"Saved results to {OUTPUT_PATH}")
-    except Exception as e:
-        logger.error(f"Failed to save dataset: {e}")
+        for key, item, line, invalid_variants, error in progress:
+            for pv, rv in invalid_variants:
+                logger.warning(f"Invalid variant: prompt='{pv}', response='{rv}'")
+                skipped.write({"prompt_variant": pv, "response_variant": rv}, ERROR_INVALID_VARIANT,
+                              "Invalid Arabizi")
+
+            if error is None:
+                writer.write_line(key, line)
+                processed_count += 1
+            elif isinstance(error, ValueError):
+                skipped_count += 1
+                writer.write(key)
+                logger.error(f"Validation error: {error}")
+                skipped.write({"item": item}, ERROR_VALIDATION, error)
+            elif isinstance(error, KeyError):
+                skipped_count += 1
+                writer.write(key)
+                logger.error(f"Missing key in entry: {error}")
+                skipped.write({"item": item}, ERROR_MISSING_KEY, f"Missing key: {error}")
+            else:
+                skipped_count += 1  # Not checkpointed, so a resumed run retries it
+                retry_count += 1
+                logger.error(f"Error processing entry: {error}")
+                skipped.write({"item": item}, ERROR_UNEXPECTED, error)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        writer.close()
+        skipped.close()
+
+    logger.info(f"Processed {processed_count} entries, skipped {skipped_count}; "
+                f"{len(completed)} entries are done in total")
+    if shard is not None:
+        write_shard_manifest(output_path, shard_index, num_shards, INPUT_PATH, run_params(), complete=retry_count == 0,
+                             counts={"processed": processed_count, "skipped": skipped_count, "retry": retry_count,
+                                     "done": len(completed)})
+    metrics = get_metrics()
+    metrics.add_records("main", processed_count + skipped_count)
+    if dedup is not None:
+        dedup.log_summary("dialogs" if TRANSLATION_MODE == "dialog" else "pairs")
+        metrics.gauge("dedup", {"units": dedup.count, "groups": dedup.groups, "near_matches": dedup.near_matches})
+    log_summaries()
+    cache = get_cache() if USE_GPT else None
+    if cache is not None:
+        stats = cache.stats()
+        metrics.gauge("cache", stats)
+        logger.info(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses "
+                    f"({stats['hit_rate']:.1%} hit rate), {stats['size_bytes']} bytes on disk; "
+                    f"{stats['filtered_hits']} known content-filtered inputs skipped")
+    if USE_GPT:
+        get_pool().log_summary()
+        metrics.gauge("endpoints", get_pool().stats())
+    logger.info(f"Saved results to {output_path}")
+
+
+def merge(num_shards=None):
+    """Check that all num_shards (default NUM_SHARDS) shards are complete and merge them into OUTPUT_PATH."""
+    return merge_shards(OUTPUT_PATH, SKIPPED_PATH, num_shards or NUM_SHARDS, INPUT_PATH, run_params())
+
+
+def run_claimed_shards(num_shards=None):
+    """
+    Work through the shards with other nodes sharing the output directory: claim every shard that no
+    node has finished or is running, run it, then merge if all shards are complete. The merge is claimed
+    too, so the node finishing the last shard does it. Shards run on another input or with other
+    settings count as unfinished and run again. Returns True if this node merged the shards.
+    Raises ShardMergeError if the merge finds the shards inconsistent.
+    """
+    num_shards = num_shards or NUM_SHARDS
+    digests = run_digests(INPUT_PATH, run_params())
+    for index in range(num_shards):
+        path = shard_path(OUTPUT_PATH, index)
+        if is_shard_complete(path, num_shards, digests):
+            continue
+        claim = Claim(claim_path(path))
+        if not claim.acquire():
+            continue
+        with claim:
+            if is_shard_complete(path, num_shards, digests):  # Finished by another node since the check above
+                continue
+            try:
+                main(shard_index=index, num_shards=num_shards)
+            except Exception as e:
+                logger.error(f"Shard {index} of {num_shards} failed: {e}")
+
+    pending = [index for index in range(num_shards)
+               if not is_shard_complete(shard_path(OUTPUT_PATH, index), num_shards, digests)]
+    if pending:
+        logger.info(f"Not merging: shards {pending} are running elsewhere or have entries to retry")
+        return False
+    claim = Claim(claim_path(OUTPUT_PATH))
+    if not claim.acquire():
+        logger.info("Another node is merging the shards")
+        return False
+    with claim:
+        merge(num_shards)
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the Arabizi dataset; settings are in the Config section "
+                                                 "of main.py.")
+    parser.add_argument("--num-shards", type=int, default=NUM_SHARDS,
+                        help="number of shards the input is split into (see utils/sharding.py)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--shard-index", type=int, default=SHARD_INDEX, help="shard to run, from 0")
+    action.add_argument("--claim", action="store_true",
+                        help="run shards no other node has claimed, then merge once all are complete")
+    action.add_argument("--merge", action="store_true", help="check that every shard is complete and merge them")
+    args = parser.parse_args()
+    if args.num_shards < 1:
+        parser.error("--num-shards must be at least 1")
+    if args.num_shards == 1 and (args.claim or args.merge):
+        parser.error("--claim and --merge need --num-shards of 2 or more")
+    if args.num_shards > 1 and not (args.claim or args.merge) and args.shard_index is None:
+        parser.error("a sharded run needs --shard-index, --claim or --merge")
+    if args.shard_index is not None and not 0 <= args.shard_index < args.num_shards:
+        parser.error(f"--shard-index must be between 0 and {args.num_shards - 1}")
+    return args
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    try:
+        if args.merge:
+            merge(args.num_shards)
+        elif args.claim:
+            run_claimed_shards(args.num_shards)
+        else:
+            main(shard_index=args.shard_index, num_shards=args.num_shards)
+    except ShardMergeError as e:
+        logger.error(e)
+        sys.exit(1)
@@ -1,57 +1,34 @@
-import pandas as pd
-import re
-import os
-
-def clean_text(text):
-    """Clean text by removing unwanted characters and stripping whitespace."""
-    return re.sub(r"[^\w\s.,!?']", '', text).strip()
-
-def split_dialog(dialog):
-    """Split dialog into turns based on punctuation or other delimiters."""
-    # If dialog is already a list, return it
-    if isinstance(dialog, list):
-        return dialog
-    # Replace common delimiters with a unique separator (e.g., '||')
-    dialog = re.sub(r'[.!?]+\s+', '||', dialog)
-    # Split into turns and clean each turn
-    turns = [clean_text(turn) for turn in dialog.split('||') if turn.strip()]
-    return turns
+import utils.preprocessing
+from utils.preprocessing import iter_pairs
+from utils.manifest import StageManifest
+from utils.io_utils import RecordWriter, stage_path
+from utils.metrics import get_metrics, instrumented_stage
 
 def preprocess_dataset(input_path):
-    """Preprocess DailyDialog CSV dataset to extract prompt-response pairs."""
-    # Read CSV file
-    df = pd.read_csv(input_path)
-
-    # Initialize lists to store prompt-response pairs
-    prompts = []
-    responses = []
-
-    for _, row in df.iterrows():
-        # Split dialog into turns
-        dialog_turns = split_dialog(row['dialog'])
-
-        # Create prompt-response pairs (assuming alternating speakers)
-        for i in range(0, len(dialog_turns) - 1, 2):
-            prompts.append(dialog_turns[i])
-            responses.append(dialog_turns[i + 1])
+    """Stream prompt-response pairs out of a DailyDialog CSV dataset, a chunk of rows at a time."""
+    # Split, clean and pair the dialogs of each chunk with column-wide string ops
+    # (pairs (0, 1), (2, 3), ... assuming alternating speakers)
+    return iter_pairs(input_path, stride=2)
 
-    # Create new DataFrame with prompt-response pairs
-    processed_df = pd.DataFrame({
-        'prompt': prompts,
-        'response': responses
-    })
-
-    return processed_df
-
-if __name__ == "__main__":
+@instrumented_stage("1_preprocess")
+def main(force=False, data_dir="../data"):
     # Specify input and output paths
-    input_path = "../data/raw/train.csv"  # Adjust to your CSV file path
-    output_path = "../data/translated/preprocessed.json"
+    input_path = f"{data_dir}/raw/train.csv"  # Adjust to your CSV file path
+    output_path = stage_path(f"{data_dir}/translated/preprocessed.json")  # Suffix follows ARABIZI_STAGE_FORMAT
+
+    # Skip the stage if neither the CSV nor the preprocessing code changed since the last run
+    manifest = StageManifest(output_path, deps={"script": __file__, "preprocessing": utils.preprocessing.__file__})
+    if not force and manifest.is_fresh(input_path):
+        print(f"{output_path} is up to date")
+        return
+
+    # Preprocess the dataset and save the pairs as they are produced
+    with RecordWriter(output_path) as writer:
+        for pair in preprocess_dataset(input_path):
+            writer.write(pair)
+    manifest.save(input_path)
+    get_metrics().add_records("1_preprocess", writer.count)
+    print(f"Preprocessed dataset saved to {output_path} ({writer.count} pairs)")
 
-    # Preprocess dataset
-    df = preprocess_dataset(input_path)
-
-    # Save preprocessed file
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    df.to_json(output_path, orient="records", indent=2)
-    print(f"Preprocessed dataset saved to {output_path}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
-import json
-import os
-import ijson
-from utils.gpt_api import translate_with_gpt
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from utils.concurrency import ordered_submit
+import utils.gpt_api
+from utils.gpt_api import translate_with_gpt, translate_with_batch_job, get_cache, MAX_CONCURRENCY
+from utils.metrics import get_metrics, instrumented_stage
+from utils.manifest import StageManifest
+from utils.dedup import Deduplicator
+from utils.io_utils import RecordWriter, iter_records, stage_path
+from utils.skipped_sink import get_sink, ERROR_MISSING_KEY, ERROR_UNEXPECTED
 import logging
 from tqdm import tqdm
 
@@ -9,64 +15,112 @@ from tqdm import tqdm
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
+@instrumented_stage("2_translate_gpt")
+def main(force=False, data_dir="../data", limit=15):
     # File paths (relative to script location)
-    input_path = "../data/translated/preprocessed.json"
-    output_path = "../data/translated/translated1.json"
-    skipped_path = "../data/corrected/skipped_entries.jsonl"
+    # (suffixes follow ARABIZI_STAGE_FORMAT: json, jsonl or parquet)
+    input_path = stage_path(f"{data_dir}/translated/preprocessed.json")
+    output_path = stage_path(f"{data_dir}/translated/translated1.json")
+    skipped_path = f"{data_dir}/corrected/skipped_entries.jsonl"
+    near_duplicates = False  # Also group near-duplicate entries (MinHash/LSH), not only exact ones
+    batch_job = False  # Translate the entries in one offline batch job instead of one request each
 
-    # Load only the first 15 entries
-    data = []
+    # Skip the stage if the input and the translation code are unchanged; otherwise reuse
+    # the translations of unchanged entries and only send new ones to GPT
+    manifest = StageManifest(output_path, deps={"script": __file__, "gpt_api": utils.gpt_api.__file__})
+    if not force and manifest.is_fresh(input_path):
+        logger.info(f"{output_path} is up to date")
+        return
+
+    # Load only the first `limit` entries (all of them if None)
     try:
-        with open(input_path, 'rb') as f:
-            parser = ijson.items(f, 'item')
-            for i, entry in enumerate(parser):
-                if i >= 15:
-                    break
-                data.append(entry)
+        data = list(islice(iter_records(input_path), limit))
         logger.info(f"Loaded {len(data)} entries from {input_path}")
     except FileNotFoundError:
         logger.error(f"Input file not found: {input_path}")
         return
-    except ijson.JSONError:
-        logger.error(f"Invalid JSON in {input_path}")
+    except Exception as e:
+        logger.error(f"Invalid input in {input_path}: {e}")
         return
 
     if not data:
         logger.error("No entries loaded from input file")
         return
 
-    output = []
-    # Process entries with progress bar
-    for entry in tqdm(data, desc="Translating entries"):
-        try:
-            prompt, response = entry["prompt"], entry["response"]
-            arabizi_prompt, arabizi_response = translate_with_gpt(prompt, response)
-            entry["prompt_arabizi"] = arabizi_prompt
-            entry["response_arabizi"] = arabizi_response
-            output.append(entry)
-        except KeyError as e:
-            logger.error(f"Missing key in entry: {e}. Skipping.")
-            with open(skipped_path, "a", encoding='utf-8') as f:
-                json.dump({"prompt": entry.get("prompt"), "response": entry.get("response"),
-                           "error": f"Missing key: {e}"}, f, ensure_ascii=False)
-                f.write("\n")
-            continue
-        except Exception as e:
-            logger.error(f"Unexpected error for entry: {e}. Skipping.")
-            with open(skipped_path, "a", encoding='utf-8') as f:
-                json.dump({"prompt": prompt, "response": response, "error": str(e)}, f, ensure_ascii=False)
-                f.write("\n")
-            continue
+    def translate_entry(entry):
+        return translate_with_gpt(entry["prompt"], entry["response"])
+
+    # Entries translated by a previous run with unchanged code are reused as they are. Entries that
+    # duplicate an earlier one (same text up to case, punctuation and spacing) are not sent to GPT:
+    # they get the translation of the first entry of their group
+    dedup = Deduplicator(near_duplicates=near_duplicates)
+    pending = []
+    for entry in data:
+        digest, previous = manifest.lookup(entry)
+        group, is_new = dedup.add([entry.get("prompt"), entry.get("response")])
+        pending.append((entry, digest, None if force else previous, group, is_new))
+    if manifest.reused and not force:
+        logger.info(f"Reusing {manifest.reused} translations from the previous run")
+    dedup.log_summary("entries")
+
+    # In batch job mode, every entry that needs GPT is translated up front by one job
+    batch_results = {}
+    if batch_job:
+        todo = [(group, entry) for entry, _, previous, group, is_new in pending
+                if previous is None and is_new and "prompt" in entry and "response" in entry]
+        translations = translate_with_batch_job([(entry["prompt"], entry["response"]) for _, entry in todo])
+        batch_results = {group: translation for (group, _), translation in zip(todo, translations)}
+
+    def translate_pending(item):
+        entry, _, previous, group, is_new = item
+        if previous is not None:
+            return previous["prompt_arabizi"], previous["response_arabizi"]
+        if not is_new:
+            return None  # Filled in from the group's first entry
+        if group in batch_results:
+            return batch_results[group]
+        return translate_entry(entry)
 
-    # Save translated data
+    skipped = get_sink(skipped_path)
+    # Process entries concurrently; results come back in input order and are streamed to output_path
     try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved {len(output)} entries to {output_path}")
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor, RecordWriter(output_path) as writer:
+            translations = ordered_submit(executor, translate_pending, pending, MAX_CONCURRENCY * 2)
+            outcomes = {}  # Group -> translation (or error) of its first entry
+            for (entry, digest, _, group, is_new), future in tqdm(translations, total=len(data),
+                                                                   desc="Translating entries"):
+                try:
+                    prompt, response = entry.get("prompt"), entry.get("response")
+                    if is_new:
+                        outcomes[group] = future.exception() or future.result()
+                    translation = future.result() or outcomes[group]
+                    if isinstance(translation, Exception):
+                        raise translation
+                    arabizi_prompt, arabizi_response = translation
+                    entry["prompt_arabizi"] = arabizi_prompt
+                    entry["response_arabizi"] = arabizi_response
+                    writer.write(entry)
+                    manifest.add(digest)
+                except KeyError as e:
+                    logger.error(f"Missing key in entry: {e}. Skipping.")
+                    skipped.write({"prompt": entry.get("prompt"), "response": entry.get("response")},
+                                  ERROR_MISSING_KEY, f"Missing key: {e}")
+                    continue
+                except Exception as e:
+                    logger.error(f"Unexpected error for entry: {e}. Skipping.")
+                    skipped.write({"prompt": prompt, "response": response}, ERROR_UNEXPECTED, e)
+                    continue
+        manifest.save(input_path)
+        get_metrics().add_records("2_translate_gpt", writer.count)
+        logger.info(f"Saved {writer.count} entries to {output_path}")
     except Exception as e:
         logger.error(f"Failed to save output: {e}")
+    finally:
+        skipped.close()
+        skipped.log_summary()
+        cache = get_cache()
+        if cache is not None:
+            get_metrics().gauge("cache", cache.stats())
 
 if __name__ == "__main__":
     main()
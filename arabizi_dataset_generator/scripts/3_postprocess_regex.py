@@ -1,75 +1,90 @@
-import json
 import os
 import logging
 from tqdm import tqdm
-from utils.regex_rules import load_corrections, apply_corrections, validate_arabizi
+import utils.regex_rules
+import utils.arabizi_scorer
+from utils.regex_rules import get_correction_engine, DEFAULT_CORRECTIONS_PATH
+from utils.arabizi_scorer import validate_arabizi_batch, DEFAULT_MODEL_PATH
+from utils.manifest import StageManifest
+from utils.io_utils import RecordWriter, iter_records, stage_path
+from utils.metrics import get_metrics, instrumented_stage
+from utils.skipped_sink import get_sink, ERROR_INVALID_ARABIZI, ERROR_UNEXPECTED
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
-    # File paths
-    input_path = "D:/code-X_internship/arabizi_dataset_generator/data/translated/translated1.json"
-    output_path = "D:/code-X_internship/arabizi_dataset_generator/data/corrected/Regex_cleaned.json"
-    skipped_path = "D:/code-X_internship/arabizi_dataset_generator/data/corrected/skipped_postprocess.jsonl"
+@instrumented_stage("3_postprocess_regex")
+def main(force=False, data_dir="D:/code-X_internship/arabizi_dataset_generator/data"):
+    # File paths (suffixes follow ARABIZI_STAGE_FORMAT: json, jsonl or parquet)
+    input_path = stage_path(f"{data_dir}/translated/translated1.json")
+    output_path = stage_path(f"{data_dir}/corrected/Regex_cleaned.json")
+    skipped_path = f"{data_dir}/corrected/skipped_postprocess.jsonl"
 
-    # Load input data
-    try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        logger.info(f"Loaded {len(data)} entries from {input_path}")
-    except FileNotFoundError:
-        logger.error(f"Input file not found: {input_path}")
-        return
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in {input_path}")
+    # Skip the stage if the input and the correction rules are unchanged; otherwise only new
+    # entries are corrected. Corrections apply in sequence, so a rule edit re-runs every entry.
+    manifest = StageManifest(output_path, deps={"script": __file__, "regex_rules": utils.regex_rules.__file__,
+                                                "corrections": DEFAULT_CORRECTIONS_PATH,
+                                                "arabizi_scorer": utils.arabizi_scorer.__file__,
+                                                "arabizi_model": DEFAULT_MODEL_PATH})
+    if not force and manifest.is_fresh(input_path):
+        logger.info(f"{output_path} is up to date")
         return
 
-    # Load corrections
-    corrections = load_corrections()
+    # Input entries are streamed, not loaded at once
+    if not os.path.exists(input_path):
+        logger.error(f"Input file not found: {input_path}")
+        return
 
-    # Process entries
-    output = []
-    for entry in tqdm(data, desc="Post-processing entries"):
-        try:
-            prompt_arabizi = entry.get("prompt_arabizi", "")
-            response_arabizi = entry.get("response_arabizi", "")
+    # Load and compile corrections once
+    engine = get_correction_engine()
 
-            # Apply corrections
-            corrected_prompt = apply_corrections(prompt_arabizi, corrections)
-            corrected_response = apply_corrections(response_arabizi, corrections)
+    # Process entries, streaming them to output_path
+    skipped = get_sink(skipped_path)
+    try:
+        with RecordWriter(output_path) as writer:
+            for entry in tqdm(iter_records(input_path), desc="Post-processing entries"):
+                digest, previous = manifest.lookup(entry)
+                if previous is not None and not force:
+                    writer.write(previous)
+                    manifest.add(digest)
+                    continue
+                try:
+                    prompt_arabizi = entry.get("prompt_arabizi", "")
+                    response_arabizi = entry.get("response_arabizi", "")
 
-            # Validate Arabizi
-            if not validate_arabizi(corrected_prompt) or not validate_arabizi(corrected_response):
-                logger.warning(f"Invalid Arabizi in entry: prompt='{corrected_prompt}', response='{corrected_response}'")
-                with open(skipped_path, "a", encoding='utf-8') as f:
-                    json.dump({"prompt_arabizi": corrected_prompt, "response_arabizi": corrected_response,
-                               "error": "Invalid Arabizi"}, f, ensure_ascii=False)
-                    f.write("\n")
-                entry["prompt_arabizi"] = corrected_prompt
-                entry["response_arabizi"] = corrected_response
-                output.append(entry)
-                continue
+                    # Apply corrections
+                    corrected_prompt = engine.apply(prompt_arabizi)
+                    corrected_response = engine.apply(response_arabizi)
 
-            entry["prompt_arabizi"] = corrected_prompt
-            entry["response_arabizi"] = corrected_response
-            output.append(entry)
-        except Exception as e:
-            logger.error(f"Error processing entry: {e}. Skipping.")
-            with open(skipped_path, "a", encoding='utf-8') as f:
-                json.dump({"entry": entry, "error": str(e)}, f, ensure_ascii=False)
-                f.write("\n")
-            continue
+                    # Validate Arabizi; entries with neither side valid (e.g. English left untranslated)
+                    # are dropped here, as in main.py, so they never reach the variant stage
+                    scores, valid = validate_arabizi_batch([corrected_prompt, corrected_response])
+                    if not valid.any():
+                        logger.warning(f"Invalid Arabizi in entry (scores {scores[0]:.2f}, {scores[1]:.2f}): "
+                                       f"prompt='{corrected_prompt}', response='{corrected_response}'")
+                        skipped.write({"prompt_arabizi": corrected_prompt, "response_arabizi": corrected_response},
+                                      ERROR_INVALID_ARABIZI, "Invalid Arabizi")
+                        continue
 
-    # Save cleaned data
-    try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved {len(output)} entries to {output_path}")
+                    entry["prompt_arabizi"] = corrected_prompt
+                    entry["response_arabizi"] = corrected_response
+                    writer.write(entry)
+                    manifest.add(digest)
+                except Exception as e:
+                    logger.error(f"Error processing entry: {e}. Skipping.")
+                    skipped.write({"entry": entry}, ERROR_UNEXPECTED, e)
+                    continue
+        manifest.save(input_path)
+        if manifest.reused:
+            logger.info(f"Reused {manifest.reused} entries from the previous run")
+        get_metrics().add_records("3_postprocess_regex", writer.count)
+        logger.info(f"Saved {writer.count} entries to {output_path}")
     except Exception as e:
-        logger.error(f"Failed to save output: {e}")
+        logger.error(f"Failed to process {input_path}: {e}")
+    finally:
+        skipped.close()
+        skipped.log_summary()
 
 if __name__ == "__main__":
     main()
@@ -1,74 +1,113 @@
-import json
 import os
+import re
 import logging
 from tqdm import tqdm
-from utils.variant_rules import generate_variants, validate_arabizi
+import utils.variant_rules
+import utils.arabizi_scorer
+from utils.variant_rules import variant_pairs, variant_seed, load_variant_map, VARIANT_MODE
+from utils.arabizi_scorer import validate_arabizi_batch, DEFAULT_MODEL_PATH
+from utils.manifest import StageManifest
+from utils.io_utils import RecordWriter, iter_records, stage_path
+from utils.metrics import get_metrics, instrumented_stage
+from utils.skipped_sink import get_sink, ERROR_INVALID_VARIANT, ERROR_UNEXPECTED
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
-    # File paths
-    input_path = "D:/code-X_internship/arabizi_dataset_generator/data/corrected/Regex_cleaned.json"
-    output_path = "D:/code-X_internship/arabizi_dataset_generator/data/final/arabizi_dataset.json"
-    skipped_path = "D:/code-X_internship/arabizi_dataset_generator/data/corrected/skipped_entries.jsonl"
+def variants_affected_by(changed_patterns):
+    """
+    Predicate over previous output entries: variant rules replace matches in a single pass, so an entry
+    is only affected by an added, removed or edited rule whose pattern occurs in its text.
+    """
+    valid = []
+    for pattern in changed_patterns:
+        try:
+            re.compile(pattern)
+            valid.append(f"(?:{pattern})")
+        except re.error:
+            continue  # Invalid rules are skipped by the engine too
+    if not valid:
+        return lambda entry: False
+    changed = re.compile("|".join(valid), re.IGNORECASE)  # Same flags as VariantEngine
 
-    # Load input data
-    try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        logger.info(f"Loaded {len(data)} entries from {input_path}")
-    except FileNotFoundError:
-        logger.error(f"Input file not found: {input_path}")
-        return
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in {input_path}")
+    def is_affected(entry):
+        return any(changed.search(entry.get(field, "").strip()) for field in ("prompt_arabizi", "response_arabizi"))
+    return is_affected
+
+@instrumented_stage("4_generate_variants")
+def main(force=False, data_dir="D:/code-X_internship/arabizi_dataset_generator/data"):
+    # File paths (suffixes follow ARABIZI_STAGE_FORMAT: json, jsonl or parquet, where variants are a list column)
+    input_path = stage_path(f"{data_dir}/corrected/Regex_cleaned.json")
+    output_path = stage_path(f"{data_dir}/final/arabizi_dataset.json")
+    skipped_path = f"{data_dir}/corrected/skipped_entries.jsonl"
+    run_seed = 0  # Mixed into every variant seed
+
+    # Skip the stage if the input and the variant rules are unchanged; otherwise only new entries
+    # and entries matched by an edited rule get new variants
+    manifest = StageManifest(output_path, deps={"script": __file__, "variant_rules": utils.variant_rules.__file__,
+                                                "arabizi_scorer": utils.arabizi_scorer.__file__,
+                                                "arabizi_model": DEFAULT_MODEL_PATH},
+                             params={"run_seed": run_seed, "variant_mode": VARIANT_MODE}, rules=load_variant_map(),
+                             affected_check=variants_affected_by)
+    if not force and manifest.is_fresh(input_path):
+        logger.info(f"{output_path} is up to date")
         return
 
-    # Process entries
-    output = []
-    for entry in tqdm(data, desc="Generating variants"):
-        try:
-            prompt_arabizi = entry.get("prompt_arabizi", "").strip()
-            response_arabizi = entry.get("response_arabizi", "").strip()
+    # Input entries are streamed, not loaded at once
+    if not os.path.exists(input_path):
+        logger.error(f"Input file not found: {input_path}")
+        return
 
-            # Generate variants with consistent seed
-            seed = hash(prompt_arabizi + response_arabizi) % 10000
-            prompt_variants = generate_variants(prompt_arabizi, seed=seed)
-            response_variants = generate_variants(response_arabizi, seed=seed)
+    # Process entries, streaming them to output_path
+    skipped = get_sink(skipped_path)
+    try:
+        with RecordWriter(output_path) as writer:
+            for entry in tqdm(iter_records(input_path), desc="Generating variants"):
+                digest, previous = manifest.lookup(entry)
+                if previous is not None and not force:
+                    writer.write(previous)
+                    manifest.add(digest)
+                    continue
+                try:
+                    prompt_arabizi = entry.get("prompt_arabizi", "").strip()
+                    response_arabizi = entry.get("response_arabizi", "").strip()
 
-            # Validate variants
-            valid_variants = []
-            for v1, v2 in zip(prompt_variants, response_variants):
-                if validate_arabizi(v1) and validate_arabizi(v2):
-                    valid_variants.append({"prompt_variant": v1, "response_variant": v2})
-                else:
-                    logger.warning(f"Invalid variant: prompt='{v1}', response='{v2}'")
-                    with open(skipped_path, "a", encoding='utf-8') as f:
-                        json.dump({"prompt_variant": v1, "response_variant": v2, "error": "Invalid Arabizi"},
-                                  f, ensure_ascii=False)
-                        f.write("\n")
+                    # Generate variants with consistent seed
+                    seed = variant_seed(prompt_arabizi, response_arabizi, run_seed)
+                    pairs = variant_pairs(prompt_arabizi, response_arabizi, seed=seed)
 
-            entry["variants"] = valid_variants if valid_variants else [
-                {"prompt_variant": prompt_arabizi, "response_variant": response_arabizi}
-            ]
-            output.append(entry)
-        except Exception as e:
-            logger.error(f"Error processing entry: {e}. Skipping.")
-            with open(skipped_path, "a", encoding='utf-8') as f:
-                json.dump({"entry": entry, "error": str(e)}, f, ensure_ascii=False)
-                f.write("\n")
-            continue
+                    # Validate variants, all of the entry's in one batch
+                    _, valid = validate_arabizi_batch([v1 for v1, _ in pairs] + [v2 for _, v2 in pairs])
+                    valid = valid[:len(pairs)] & valid[len(pairs):]
+                    valid_variants = []
+                    for (v1, v2), is_valid in zip(pairs, valid):
+                        if is_valid:
+                            valid_variants.append({"prompt_variant": v1, "response_variant": v2})
+                        else:
+                            logger.warning(f"Invalid variant: prompt='{v1}', response='{v2}'")
+                            skipped.write({"prompt_variant": v1, "response_variant": v2}, ERROR_INVALID_VARIANT,
+                                          "Invalid Arabizi")
 
-    # Save output data
-    try:
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        logger.info(f"Saved {len(output)} entries to {output_path}")
+                    entry["variants"] = valid_variants if valid_variants else [
+                        {"prompt_variant": prompt_arabizi, "response_variant": response_arabizi}
+                    ]
+                    writer.write(entry)
+                    manifest.add(digest)
+                except Exception as e:
+                    logger.error(f"Error processing entry: {e}. Skipping.")
+                    skipped.write({"entry": entry}, ERROR_UNEXPECTED, e)
+                    continue
+        manifest.save(input_path)
+        if manifest.reused:
+            logger.info(f"Reused {manifest.reused} entries from the previous run")
+        get_metrics().add_records("4_generate_variants", writer.count)
+        logger.info(f"Saved {writer.count} entries to {output_path}")
     except Exception as e:
-        logger.error(f"Failed to save output: {e}")
+        logger.error(f"Failed to process {input_path}: {e}")
+    finally:
+        skipped.close()
+        skipped.log_summary()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
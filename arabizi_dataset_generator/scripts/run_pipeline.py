@@ -0,0 +1,58 @@
+"""
+Run the pipeline stages in order: preprocess -> translate -> regex corrections -> variants.
+Every stage keeps a manifest next to its output (see utils/manifest.py). A stage whose input, code and
+rule files are unchanged is skipped; otherwise only new or affected records are recomputed. Editing
+configs/corrections.json therefore re-runs regex correction and variants only, reusing the translations.
+
+Run from the project root:
+    python -m scripts.run_pipeline [--stages 3 4] [--force 4] [--profile 3]
+
+Every stage writes its metrics to logs/metrics_<stage>.json and the whole run to logs/metrics_pipeline.json
+(see utils/metrics.py); --profile also runs the given stages under cProfile.
+"""
+import argparse
+import importlib
+import logging
+import os
+import sys
+from pathlib import Path
+
+from utils.metrics import get_metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+STAGES = ["1_preprocess", "2_translate_gpt", "3_postprocess_regex", "4_generate_variants"]
+
+
+def stage_number(name):
+    return name.split("_", 1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", default=[stage_number(name) for name in STAGES],
+                        help="stage numbers to run, in pipeline order (default: all)")
+    parser.add_argument("--force", nargs="*", default=[], help="stage numbers to re-run from scratch")
+    parser.add_argument("--profile", nargs="*", default=[], help="stage numbers to profile with cProfile")
+    args = parser.parse_args()
+
+    # The stages use paths relative to scripts/ and import utils from the project root
+    sys.path.insert(0, str(SCRIPTS_DIR.parent))
+    os.chdir(SCRIPTS_DIR)
+    metrics = get_metrics()
+    metrics.enable_profiling(name for name in STAGES if stage_number(name) in args.profile)
+
+    for name in STAGES:
+        number = stage_number(name)
+        if number not in args.stages:
+            continue
+        logger.info(f"Stage {name}")
+        stage = importlib.import_module(f"scripts.{name}")
+        stage.main(force=number in args.force)
+    metrics.write_report("pipeline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Arabizi vs. English scorer over hashed character trigrams, for validating translations in batches.
+The model is a table of log-likelihood ratios, log P(trigram | Arabizi) - log P(trigram | English), with
+trigrams hashed into NUM_BUCKETS buckets. A text's score is the mean ratio of its trigrams, so it is
+positive when the text reads more like Arabizi than English whatever its length; texts scoring at least
+the model's threshold are valid. Texts are scored all at once with numpy: one encode of the joined
+texts, one vectorized hash and one bincount, so whole lists or pandas Series go through at hundreds of
+thousands of strings per second.
+
+The model (configs/arabizi_ngram.npz) is trained on the seed corpus in configs/arabizi_corpus.txt,
+with spelling variants from configs/variants.json, against the English turns of data/raw/*.csv.
+Retrain it after editing the corpus, from the project root:
+    python -m utils.arabizi_scorer --train
+Score texts with it:
+    python -m utils.arabizi_scorer "kifak ya zalame" "How are you doing?"
+"""
+import argparse
+import re
+import threading
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_MODEL_PATH = BASE_DIR / "configs" / "arabizi_ngram.npz"
+DEFAULT_CORPUS_PATH = BASE_DIR / "configs" / "arabizi_corpus.txt"
+NUM_BUCKETS = 1 << 15  # Hash buckets of the trigram table; 64 KB as float16
+SMOOTHING = 0.5  # Added to every bucket count, so trigrams unseen in one language do not dominate
+TRAINING_VARIANTS = 3  # Spelling variants of every corpus line added to the Arabizi training texts
+_NGRAM = 3
+_SEPARATOR = "\x00"
+_MULTIPLIERS = (np.uint32(0x9E3779B1), np.uint32(0x85EBCA77), np.uint32(0xC2B2AE3D))
+_LEGACY_PATTERN = re.compile(r'[37shkhgh2]', re.IGNORECASE)
+
+
+def hashed_trigrams(texts, buckets=NUM_BUCKETS):
+    """
+    Hash the lowercased character trigrams of every text, each padded with a space on either side.
+    Returns (ids, owners): the bucket of every trigram and the index of the text it comes from.
+    Anything that is not a string (None, NaN) counts as an empty text.
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    joined = f" {_SEPARATOR} ".join(texts)
+    if joined.count(_SEPARATOR) != max(len(texts) - 1, 0):  # A text contains the separator itself
+        joined = f" {_SEPARATOR} ".join(text.replace(_SEPARATOR, " ") for text in texts)
+    codes = np.frombuffer(f" {joined} ".lower().encode("utf-32-le"), dtype=np.uint32)
+    if codes.size < _NGRAM:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    count = codes.size - _NGRAM + 1
+    hashes = np.zeros(count, dtype=np.uint32)
+    for position, multiplier in enumerate(_MULTIPLIERS):
+        hashes ^= codes[position:position + count] * multiplier
+    hashes ^= hashes >> np.uint32(15)
+    separators = codes == ord(_SEPARATOR)
+    inside = ~(separators[:count] | separators[1:count + 1] | separators[2:count + 2])
+    owners = np.cumsum(separators[:count], dtype=np.int32)
+    return (hashes[inside] % np.uint32(buckets)).astype(np.intp), owners[inside]
+
+
+class ArabiziScorer:
+    """
+    Scores texts with a trigram log-likelihood ratio table (see the module docstring).
+    score(texts) returns a float32 array, -inf for texts too short to have a trigram;
+    validate(texts) also returns the mask of scores at or above the threshold.
+    """
+
+    def __init__(self, weights, threshold=0.0):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.threshold = float(threshold)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_MODEL_PATH):
+        with np.load(path) as model:
+            scorer = cls(model["weights"], float(model["threshold"]))
+        logger.info(f"Loaded Arabizi scorer from {path}")
+        return scorer
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), threshold=np.float32(self.threshold))
+
+    @classmethod
+    def train(cls, arabizi_texts, english_texts, buckets=NUM_BUCKETS, smoothing=SMOOTHING):
+        """Build the ratio table from two lists of texts. The threshold is left at 0; see fit_threshold()."""
+        def log_probabilities(texts):
+            counts = np.bincount(hashed_trigrams(texts, buckets)[0], minlength=buckets) + smoothing
+            return np.log(counts / counts.sum())
+        return cls(log_probabilities(arabizi_texts) - log_probabilities(english_texts))
+
+    def fit_threshold(self, arabizi_texts, english_texts):
+        """Set the threshold that separates the two lists best (highest balanced accuracy). Returns it."""
+        arabizi, english = self.score(arabizi_texts), self.score(english_texts)
+        candidates = np.unique(np.concatenate([arabizi, english]))
+        candidates = candidates[np.isfinite(candidates)]
+        accepted = 1 - np.searchsorted(np.sort(arabizi), candidates) / max(len(arabizi), 1)
+        rejected = np.searchsorted(np.sort(english), candidates) / max(len(english), 1)
+        self.threshold = float(candidates[np.argmax(accepted + rejected)]) if candidates.size else 0.0
+        return self.threshold
+
+    def score(self, texts):
+        texts = list(texts)
+        ids, owners = hashed_trigrams(texts, len(self.weights))
+        totals = np.bincount(owners, weights=self.weights[ids], minlength=len(texts))
+        counts = np.bincount(owners, minlength=len(texts))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(counts > 0, totals / np.maximum(counts, 1), -np.inf)
+        return scores.astype(np.float32)
+
+    def validate(self, texts, threshold=None):
+        scores = self.score(texts)
+        return scores, scores >= (self.threshold if threshold is None else threshold)
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_scorer(path=DEFAULT_MODEL_PATH):
+    """
+    Return the process-wide ArabiziScorer, loading the model on first use.
+    Returns None, after a warning, if the model file is missing or unreadable.
+    """
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                try:
+                    _scorer = ArabiziScorer.from_file(path)
+                except Exception as e:
+                    logger.warning(f"Failed to load Arabizi scorer from {path}: {e}; "
+                                   f"falling back to the character check")
+                    _scorer = False
+    return _scorer or None
+
+
+def validate_arabizi_batch(texts, threshold=None):
+    """
+    Score a list or pandas Series of texts as Arabizi. Returns (scores, mask): a float32 array of scores
+    and a boolean array, True for texts that pass threshold (default: the model's).
+    Without a model, scores are 1.0 for texts containing an Arabizi-specific character, else 0.0.
+    """
+    scorer = get_scorer()
+    if scorer is not None:
+        return scorer.validate(texts, threshold)
+    scores = np.array([float(isinstance(text, str) and bool(_LEGACY_PATTERN.search(text))) for text in texts],
+                      dtype=np.float32)
+    return scores, scores >= (0.5 if threshold is None else threshold)
+
+
+def validate_arabizi(text):
+    """
+    Validate one Arabizi text.
+    Returns True if it reads as Arabizi rather than English, False otherwise (see validate_arabizi_batch).
+    """
+    if not text:
+        return False
+    return bool(validate_arabizi_batch([text])[1][0])
+
+
+def load_training_texts(corpus_path=DEFAULT_CORPUS_PATH):
+    """
+    Arabizi corpus lines and English texts (data/raw turns) to train on. Returns (lines, english), where
+    lines are (index, text) so with_variants() seeds each line's variants by its place in the corpus.
+    """
+    import pandas as pd
+    from utils.preprocessing import dialog_turn_lists
+
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        corpus = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    csv_paths = sorted((BASE_DIR / "data" / "raw").glob("*.csv"))
+    df = pd.concat([pd.read_csv(path, usecols=["dialog"]) for path in csv_paths], ignore_index=True)
+    english = [turn for turns in dialog_turn_lists(df) for turn in turns if turn]
+    return list(enumerate(corpus)), english
+
+
+def with_variants(lines, variants=TRAINING_VARIANTS):
+    """The Arabizi training texts of (index, text) corpus lines: every line and its spelling variants."""
+    from utils.variant_rules import generate_variants
+
+    texts = [text for _, text in lines]
+    for index, text in lines:
+        texts.extend(generate_variants(text, variants, seed=index))
+    return texts
+
+
+def train_model(corpus_path=DEFAULT_CORPUS_PATH, output_path=DEFAULT_MODEL_PATH, seed=0):
+    """
+    Train on load_training_texts() and save the model. The corpus lines and English texts are split
+    3:1:1 into training, validation and test sets before the variants are generated, so no variant of
+    a held-out line is trained on. The threshold is fitted on the validation set and the accuracy
+    reported on the test set.
+    """
+    lines, english = load_training_texts(corpus_path)
+    rng = np.random.default_rng(seed)
+
+    def split(items):
+        order = rng.permutation(len(items))
+        cut = len(items) // 5
+        return ([items[i] for i in order[2 * cut:]], [items[i] for i in order[:cut]],
+                [items[i] for i in order[cut:2 * cut]])
+    lines_train, lines_validation, lines_test = split(lines)
+    english_train, english_validation, english_test = split(english)
+    arabizi_train, arabizi_validation, arabizi_test = map(with_variants, (lines_train, lines_validation, lines_test))
+    scorer = ArabiziScorer.train(arabizi_train, english_train)
+    threshold = scorer.fit_threshold(arabizi_validation, english_validation)
+    accepted = scorer.validate(arabizi_test)[1].mean()
+    rejected = 1 - scorer.validate(english_test)[1].mean()
+    logger.info(f"Test set: {accepted:.1%} of {len(arabizi_test)} Arabizi texts accepted, {rejected:.1%} of "
+                f"{len(english_test)} English texts rejected at threshold {threshold:.3f} "
+                f"(fitted on {len(arabizi_validation)} + {len(english_validation)} validation texts)")
+
+    arabizi = with_variants(lines)
+    scorer = ArabiziScorer.train(arabizi, english)
+    scorer.threshold = threshold
+    scorer.save(output_path)
+    logger.info(f"Saved Arabizi scorer trained on {len(arabizi)} Arabizi and {len(english)} English texts "
+                f"to {output_path}")
+    return scorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts", nargs="*", help="texts to score")
+    parser.add_argument("--train", action="store_true", help="train the model and save it")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS_PATH))
+    parser.add_argument("--model", default=str(DEFAULT_MODEL_PATH))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.train:
+        train_model(args.corpus, args.model)
+    if args.texts:
+        scores, mask = ArabiziScorer.from_file(args.model).validate(args.texts)
+        for text, score, valid in zip(args.texts, scores, mask):
+            print(f"{score:8.3f} {'valid' if valid else 'invalid':<8} {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import time
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_DIR = Path(__file__).resolve().parent.parent / "data" / "batch"
+POLL_INTERVAL = 30.0  # Seconds between status checks of a running batch job
+BATCH_TIMEOUT = 24 * 3600  # The completion window jobs are submitted with
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchJobError(RuntimeError):
+    """A batch job failed, expired, was cancelled or did not finish in time."""
+
+
+def write_requests(path, requests):
+    """Write (custom_id, body) chat completion requests to a batch input JSONL file."""
+    os.makedirs(Path(path).parent, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/chat/completions", "body": body},
+                               ensure_ascii=False) + "\n")
+
+
+def submit(client, path):
+    """Upload a batch input file and start a job over it. Returns the batch id."""
+    with open(path, "rb") as f:
+        uploaded = client.files.create(file=(Path(path).name, f), purpose="batch")
+    batch = client.batches.create(input_file_id=uploaded.id, endpoint="/chat/completions", completion_window="24h")
+    logger.info(f"Submitted batch job {batch.id} for {path}")
+    return batch.id
+
+
+def wait(client, batch_id, poll_interval=POLL_INTERVAL, timeout=BATCH_TIMEOUT):
+    """Poll a batch job until it reaches a terminal status. Returns the batch; raises BatchJobError unless completed."""
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            break
+        if time.monotonic() > deadline:
+            raise BatchJobError(f"Batch job {batch_id} still {batch.status} after {timeout:.0f}s")
+        counts = batch.request_counts
+        if counts is not None:
+            logger.info(f"Batch job {batch_id} {batch.status}: {counts.completed + counts.failed}/{counts.total} done")
+        time.sleep(poll_interval)
+    if batch.status != "completed":
+        raise BatchJobError(f"Batch job {batch_id} {batch.status}: {batch.errors}")
+    return batch
+
+
+def read_results(client, batch):
+    """
+    Download the output and error files of a completed job.
+    Returns {custom_id: (content, error)}: the reply text of a successful request, or the error
+    message of a failed one (with content None).
+    """
+    results = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200:
+                choices = body.get("choices") or [{}]
+                results[record["custom_id"]] = ((choices[0].get("message") or {}).get("content"), None)
+            else:
+                error = record.get("error") or body.get("error") or {}
+                results[record["custom_id"]] = (None, json.dumps(error, ensure_ascii=False))
+    return results
+
+
+def run(client, requests, batch_dir=DEFAULT_BATCH_DIR, poll_interval=POLL_INTERVAL, timeout=BATCH_TIMEOUT):
+    """
+    Run (custom_id, body) requests as one batch job and return read_results() for it.
+    The input file is named after a digest of the requests, and the job id is kept next to it
+    until the results are in, so a run interrupted while polling picks up the same job instead of
+    submitting it again.
+    """
+    lines = [json.dumps([custom_id, body], ensure_ascii=False, sort_keys=True) for custom_id, body in requests]
+    digest = hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:16]
+    input_path = Path(batch_dir) / f"{digest}.jsonl"
+    job_path = Path(batch_dir) / f"{digest}.job.json"
+
+    batch_id = None
+    if job_path.exists():
+        with open(job_path, "r", encoding="utf-8") as f:
+            batch_id = json.load(f).get("batch_id")
+        logger.info(f"Resuming batch job {batch_id} for {input_path}")
+    if batch_id is None:
+        write_requests(input_path, requests)
+        batch_id = submit(client, input_path)
+        with open(job_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": batch_id}, f)
+
+    try:
+        batch = wait(client, batch_id, poll_interval, timeout)
+    except BatchJobError:
+        os.remove(job_path)  # A failed job is not resumed; the next run submits a new one
+        raise
+    results = read_results(client, batch)
+    os.remove(job_path)
+    os.remove(input_path)
+    return results
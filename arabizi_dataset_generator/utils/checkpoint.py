@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def entry_key(index, item):
+    """
+    Checkpoint key for the index-th prompt-response pair of the input stream.
+    Includes a digest of the pair, so a changed input is never mistaken for a finished one.
+    """
+    digest = hashlib.sha256(f"{item.get('prompt')}\x1f{item.get('response')}".encode("utf-8")).hexdigest()
+    return f"{index}:{digest[:16]}"
+
+
+class ResumableWriter:
+    """
+    Streams finished records to a JSONL file and keeps a checkpoint of completed input keys.
+    Each checkpoint line stores a key and the output size after that key was written; on resume
+    the output is truncated back to the last checkpointed size, so a crash between the two writes
+    never leaves a record that would be written twice. If the output is shorter than that (e.g. it
+    was restored from an older copy), the checkpoint is truncated back to the last key whose record
+    the output still holds, and the run resumes from there.
+    """
+
+    def __init__(self, output_path, checkpoint_path=None, resume=True, flush_every=20):
+        self.output_path = Path(output_path)
+        self.checkpoint_path = Path(checkpoint_path or f"{self.output_path}.checkpoint")
+        self.flush_every = flush_every
+        self.completed = set()
+        self._pending = 0
+        os.makedirs(self.output_path.parent, exist_ok=True)
+
+        offset = 0
+        if resume and self.checkpoint_path.exists():
+            offset = self._load_checkpoint(self.output_path.stat().st_size if self.output_path.exists() else 0)
+        if self.completed:
+            with open(self.output_path, "ab") as f:
+                f.truncate(offset)
+            self._output = open(self.output_path, "ab")
+            self._checkpoint = open(self.checkpoint_path, "ab")
+            logger.info(f"Resuming from {self.checkpoint_path}: {len(self.completed)} entries already done")
+        else:
+            offset = 0
+            self._output = open(self.output_path, "wb")
+            self._checkpoint = open(self.checkpoint_path, "wb")
+        self._offset = offset
+
+    def _load_checkpoint(self, size):
+        """
+        Load the completed keys whose records fit in the first size bytes of the output, and truncate
+        the checkpoint after the last of them. Returns the output offset after that key.
+        """
+        offset = end = 0
+        with open(self.checkpoint_path, "r+b") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partial last line from an interrupted run
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if entry["offset"] > size:
+                    logger.warning(f"{self.output_path} is shorter than its checkpoint says; resuming after "
+                                   f"the last of its records that is still there")
+                    break
+                self.completed.add(entry["key"])
+                offset = entry["offset"]
+                end += len(line)
+            f.truncate(end)
+        return offset
+
+    def write(self, key, record=None):
+        """Mark key as completed, first writing its output record if there is one."""
+        self.write_line(key, json.dumps(record, ensure_ascii=False) if record is not None else None)
+
+    def write_line(self, key, line=None):
+        """Like write(), for a record that is already serialized to one JSON line."""
+        if line is not None:
+            data = (line + "\n").encode("utf-8")
+            self._output.write(data)
+            self._offset += len(data)
+        self._checkpoint.write((json.dumps({"key": key, "offset": self._offset}) + "\n").encode("utf-8"))
+        self.completed.add(key)
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        # Output first: the checkpoint must never point past data that is not on disk yet
+        self._output.flush()
+        self._checkpoint.flush()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self._output.close()
+        self._checkpoint.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_checkpointed_spans(output_path, checkpoint_path=None):
+    """
+    Locate the records of a ResumableWriter's output from the offsets in its checkpoint. Yields
+    (key, start, end), the byte range of the record written for key, in output order; keys completed
+    without a record and anything written after the last checkpoint line are left out.
+    """
+    output_path = Path(output_path)
+    checkpoint_path = Path(checkpoint_path or f"{output_path}.checkpoint")
+    offset = 0
+    with open(checkpoint_path, "rb") as checkpoint:
+        for entry in checkpoint:
+            try:
+                entry = json.loads(entry)
+            except json.JSONDecodeError:
+                break  # Partial last line from an interrupted run
+            if entry["offset"] > offset:
+                yield entry["key"], offset, entry["offset"]
+                offset = entry["offset"]
@@ -0,0 +1,51 @@
+from collections import deque
+from itertools import islice
+
+
+def ordered_submit(executor, fn, iterable, max_in_flight, prepare=None):
+    """
+    Submit fn(item) for every item to the executor, keeping at most max_in_flight
+    calls outstanding. Yields (item, future) pairs in input order once each future
+    is done, so results stay deterministic no matter which call finishes first.
+    If given, prepare(item) builds the argument actually passed to fn, e.g. to send
+    only the picklable part of an item to a process pool.
+    Callers handle errors themselves by calling future.result().
+    """
+    max_in_flight = max(1, int(max_in_flight))
+    items = iter(iterable)
+
+    def submit(item):
+        return item, executor.submit(fn, prepare(item) if prepare else item)
+
+    pending = deque(submit(item) for item in islice(items, max_in_flight))
+
+    while pending:
+        item, future = pending.popleft()
+        future.exception()  # Block until done without raising
+        for next_item in islice(items, 1):
+            pending.append(submit(next_item))
+        yield item, future
+
+
+def chunked(iterable, size, counts=None):
+    """
+    Yield lists of consecutive items from iterable, each holding up to size items.
+    If given, only items for which counts(item) is true count toward size.
+    """
+    items = iter(iterable)
+    if counts is None:
+        while True:
+            chunk = list(islice(items, size))
+            if not chunk:
+                return
+            yield chunk
+    chunk, counted = [], 0
+    for item in items:
+        chunk.append(item)
+        if counts(item):
+            counted += 1
+            if counted >= size:
+                yield chunk
+                chunk, counted = [], 0
+    if chunk:
+        yield chunk
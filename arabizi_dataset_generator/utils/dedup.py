@@ -0,0 +1,145 @@
+import hashlib
+import re
+import unicodedata
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUP_THRESHOLD = 0.8  # Estimated Jaccard similarity of shingles above which two units are near-duplicates
+NUM_PERM = 64  # MinHash permutations per signature
+NUM_BANDS = 8  # LSH bands (NUM_PERM / NUM_BANDS rows each); more bands find more candidate pairs
+SHINGLE_SIZE = 3  # Characters per shingle
+# Groups remembered at once, least recently seen forgotten first, so memory stays flat on any corpus;
+# a duplicate of a forgotten group is translated again (usually a translation cache hit)
+MAX_GROUPS = 100_000
+_PRIME = (1 << 31) - 1  # Shingle hashes are 32-bit, so (a * x + b) stays within uint64
+_STRIP = re.compile(r"[^\w\s]")
+_FIELD_SEPARATOR = "\x1f"
+
+
+def dedup_text(text):
+    """Normalize a turn for duplicate detection: NFKC, case-folded, punctuation removed, whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return " ".join(_STRIP.sub(" ", text).split())
+
+
+def dedup_key(texts):
+    """
+    Fixed-size key of a unit's texts after dedup_text(): units are exact duplicates when their keys
+    are equal. A 16-byte blake2b digest, whatever the length of the texts.
+    """
+    normalized = _FIELD_SEPARATOR.join(dedup_text(text) for text in texts)
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+class Deduplicator:
+    """
+    Groups translation units (a pair's prompt and response, or a dialog's turns) that are duplicates,
+    so only the first unit of each group, its representative, is translated.
+    Units are exact duplicates when every text matches after dedup_text(). With near_duplicates, a
+    unit also joins the group of an earlier unit with as many texts if the MinHash signatures of each
+    pair of corresponding texts agree on at least `threshold` of their permutations. LSH banding keeps
+    the candidate lookup close to constant time per unit.
+    Only the max_groups most recently seen groups are remembered; a unit whose group was forgotten
+    starts a new one. A caller keeping per-group results can bound them the same way: an LRU of
+    max_groups groups, touched once per unit in the order the units were added, still holds every
+    group add() can return as a duplicate.
+    """
+
+    def __init__(self, near_duplicates=False, threshold=NEAR_DUP_THRESHOLD, num_perm=NUM_PERM, bands=NUM_BANDS,
+                 shingle_size=SHINGLE_SIZE, seed=0, max_groups=MAX_GROUPS):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_groups = max_groups
+        if near_duplicates:
+            import numpy as np  # Only MinHash needs numpy
+            rng = np.random.default_rng(seed)
+            self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+            self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self._exact = {}  # dedup_key() of a unit -> group
+        self._buckets = {}  # (text position, band, band signature) -> representative groups
+        self._signatures = {}  # Group -> signatures of its representative's texts (near_duplicates only)
+        self._groups = OrderedDict()  # Group -> its keys in _exact and its LSH bands, least recently seen first
+        self.groups = 0
+        self.count = 0
+        self.near_matches = 0
+
+    def _touch(self, group, key=None):
+        """Mark group as just seen (recording another key of it), forgetting the oldest groups over max_groups."""
+        self._groups.move_to_end(group)
+        if key is not None:
+            self._exact[key] = group
+            self._groups[group][0].append(key)
+        while len(self._groups) > self.max_groups:
+            old, (keys, bands) = self._groups.popitem(last=False)
+            for old_key in keys:
+                del self._exact[old_key]
+            for band in bands:
+                members = self._buckets[band]
+                members.remove(old)
+                if not members:
+                    del self._buckets[band]
+            self._signatures.pop(old, None)
+
+    def _new_group(self, key, bands=()):
+        group = self.groups
+        self.groups += 1
+        self._groups[group] = ([], bands)
+        self._touch(group, key)
+        return group
+
+    def signature(self, text):
+        """MinHash signature of the character shingles of a normalized text."""
+        import numpy as np
+        size = self.shingle_size
+        shingles = {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+        hashes = np.fromiter((int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(),
+                                             "little") for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        return ((hashes[:, None] * self._a + self._b) % _PRIME).min(axis=0)
+
+    def add(self, texts):
+        """
+        Assign a unit (a list of texts) to a group.
+        Returns (group, is_new), where is_new is True if the unit is its group's representative.
+        """
+        self.count += 1
+        key = dedup_key(texts)
+        group = self._exact.get(key)
+        if group is not None:
+            self._touch(group)
+            return group, False
+        if not self.near_duplicates:
+            return self._new_group(key), True
+
+        import numpy as np
+        texts = [dedup_text(text) for text in texts]
+        signatures = np.stack([self.signature(text) for text in texts]) if texts else np.empty((0, self._a.size))
+        bands = [(position, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                 for position, signature in enumerate(signatures) for band in range(self.bands)]
+        candidates = {group for band in bands for group in self._buckets.get(band, ())}
+        for group in sorted(candidates):
+            previous = self._signatures[group]
+            if len(previous) == len(signatures) and (previous == signatures).mean(axis=1).min() >= self.threshold:
+                self._touch(group, key)
+                self.near_matches += 1
+                return group, False
+        group = self._new_group(key, bands)
+        self._signatures[group] = signatures
+        for band in bands:
+            self._buckets.setdefault(band, []).append(group)
+        return group, True
+
+    def log_summary(self, unit="units"):
+        if not self.count:
+            return
+        duplicates = self.count - self.groups
+        near = f", {self.near_matches} of them near-duplicates" if self.near_duplicates else ""
+        logger.info(f"Deduplicated {self.count} {unit} into {self.groups} groups: "
+                    f"{duplicates} duplicates ({duplicates / self.count:.1%}) not translated{near}")
+
@@ -1,36 +1,54 @@
-from openai import AzureOpenAI, OpenAIError
 from dotenv import load_dotenv
+import json
 import os
+import re
+import threading
 import time
 import logging
+from pathlib import Path
+from utils.rate_limiter import estimate_tokens, get_retry_after
+from utils.router import Endpoint, EndpointPool, load_endpoints
+from utils.metrics import get_metrics
+from utils import batch_job
+from utils.batch_job import BatchJobError, DEFAULT_BATCH_DIR
+from utils.translation_cache import (TranslationCache, make_key, filter_key, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES,
+                                     DEFAULT_FILTER_TTL)
+from utils.skipped_sink import get_sink, DEFAULT_SKIPPED_PATH, ERROR_CONTENT_FILTER
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_ENDPOINTS_PATH = Path(__file__).resolve().parent.parent / "configs" / "endpoints.json"
+
 # Load environment variables
 load_dotenv()
-if not os.getenv("AZURE_OPENAI_API_KEY"):
-    logger.error("AZURE_OPENAI_KEY not found in environment variables")
-    exit(1)
-if not os.getenv("AZURE_OPENAI_ENDPOINT"):
-    logger.error("AZURE_ENDPOINT not found in environment variables")
-    exit(1)
+# Pool of endpoints and deployments to spread requests over (see configs/endpoints.example.json);
+# without the file every request goes to AZURE_OPENAI_ENDPOINT
+# (AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT are checked when the first client is created)
+ENDPOINTS_PATH = os.getenv("ARABIZI_ENDPOINTS_PATH", str(DEFAULT_ENDPOINTS_PATH))
 
-def translate_with_gpt(prompt, response, deployment_name="gpt-35-turbo-16k", max_retries=3):
-    """
-    Translate English prompt and response to Lebanese Arabizi using Azure OpenAI API.
-    Returns tuple of (arabizi_prompt, arabizi_response).
-    """
-    client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_KEY"),
-        api_version="2023-05-15",
-        azure_endpoint=os.getenv("AZURE_ENDPOINT")
-    )
-    chat_prompt = [
-        {
-            "role": "system",
-            "content": """
+DEFAULT_DEPLOYMENT = "gpt-35-turbo-16k"
+API_VERSION = "2023-05-15"
+MAX_CONCURRENCY = int(os.getenv("AZURE_OPENAI_MAX_CONCURRENCY", "8"))
+MAX_TOKENS = 150
+MAX_TOKENS_PER_TURN = 75
+DIALOG_MAX_TURNS = 16
+BATCH_MAX_PAIRS = 20
+BATCH_TOKEN_BUDGET = 3000  # Estimated prompt + completion tokens per packed request, excluding the system prompt
+TEMPERATURE = 0.5
+REQUESTS_PER_MINUTE = int(os.getenv("AZURE_OPENAI_RPM", "60"))
+TOKENS_PER_MINUTE = int(os.getenv("AZURE_OPENAI_TPM", "40000"))
+CACHE_PATH = os.getenv("ARABIZI_CACHE_PATH", str(DEFAULT_CACHE_PATH))  # Empty string disables the cache
+CACHE_MAX_BYTES = int(os.getenv("ARABIZI_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+# Seconds a content-filtered input is skipped without a request; 0 turns the negative cache off
+FILTER_TTL = float(os.getenv("ARABIZI_FILTER_TTL", str(DEFAULT_FILTER_TTL)))
+SKIPPED_PATH = os.getenv("ARABIZI_SKIPPED_PATH", str(DEFAULT_SKIPPED_PATH))  # Content-filtered entries
+BATCH_API_VERSION = "2024-10-21"  # First GA version with the batch API
+# Deployment batch jobs run on (Azure needs a Global Batch deployment); defaults to the requested one
+BATCH_DEPLOYMENT = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT")
+BATCH_DIR = os.getenv("ARABIZI_BATCH_DIR", str(DEFAULT_BATCH_DIR))  # Batch input files while their job runs
+BATCH_POLL_INTERVAL = float(os.getenv("ARABIZI_BATCH_POLL_INTERVAL", "30"))
+
+_TRANSLATOR_INSTRUCTIONS = """
 You are an expert in Lebanese Arabizi, a way of writing conversational Lebanese Arabic using Latin letters and numbers. Translate English text to Lebanese Arabizi, keeping the tone natural, casual, and true to Lebanese dialect. Use these conventions:
 - 3 for ع (e.g., 3arabi for Arabic)
 - 7 for ح (e.g., 7ayat for hayat)
@@ -40,7 +58,9 @@ You are an expert in Lebanese Arabizi, a way of writing conversational Lebanese
 - gh for غ (e.g., ghalat for غلط)
 - Use Lebanese slang and expressions (e.g., "ya zalame" for "hey man", "shou" for "what").
 - Avoid formal Arabic or other dialects (e.g., use "biddak" instead of Egyptian "3ayez").
-- Return translations in the format:
+"""
+
+SYSTEM_PROMPT = _TRANSLATOR_INSTRUCTIONS + """- Return translations in the format:
   Prompt: [translated prompt]
   Response: [translated response]
 Examples:
@@ -55,46 +75,497 @@ Output: Prompt: Shou ya3ni?
 Response: Eh, shu?
 Translate the following English conversation to Lebanese Arabizi in the same format.
 """
-        },
+
+DIALOG_SYSTEM_PROMPT = _TRANSLATOR_INSTRUCTIONS + """- The input is a numbered list of dialog turns. Return exactly one translated line per turn, keeping the numbers:
+  1. [translated turn 1]
+  2. [translated turn 2]
+Examples:
+Input:
+1. Hey man, you wanna buy some weed?
+2. Some what?
+3. What’s up? How’s it going?
+Output:
+1. Ya zalame, biddak tishtri 7ashish?
+2. Shou ya3ni?
+3. Shou 3am btsir? Kifak?
+Translate the following English dialog to Lebanese Arabizi in the same format.
+"""
+
+BATCH_SYSTEM_PROMPT = _TRANSLATOR_INSTRUCTIONS + """- The input is a JSON array of objects with "id", "prompt" and "response" fields, each an English conversation.
+- Return only a JSON array with one object per input object, keeping its "id" and replacing "prompt" and "response" with their translations:
+  [{"id": 1, "prompt": "[translated prompt]", "response": "[translated response]"}]
+Examples:
+Input: [{"id": 1, "prompt": "Hey man, you wanna buy some weed?", "response": "Some what?"}, {"id": 2, "prompt": "What’s up? How’s it going?", "response": "No, fine, and you?"}]
+Output: [{"id": 1, "prompt": "Ya zalame, biddak tishtri 7ashish?", "response": "Shou ya3ni?"}, {"id": 2, "prompt": "Shou 3am btsir? Kifak?", "response": "La2, mnih, w enta?"}]
+Translate the following English conversations to Lebanese Arabizi in the same format.
+"""
+
+class TranslationError(Exception):
+    """Raised when a request still failed after every retry (API errors, 429s or unusable replies)."""
+
+
+_client = None
+_client_lock = threading.Lock()
+_pool = None
+_cache = None
+
+
+def make_client(azure_endpoint, api_key, api_version=None):
+    """
+    Create an AzureOpenAI client. It keeps one pooled HTTP connection pool and is safe to share
+    between threads. SDK-level retries are disabled so every retry goes through the rate limiters.
+    The openai SDK is imported here, on first use, so runs without GPT never load it or its HTTP stack.
+    """
+    from openai import AzureOpenAI
+    return AzureOpenAI(api_key=api_key, api_version=api_version or API_VERSION, azure_endpoint=azure_endpoint,
+                       max_retries=0)
+
+
+def _default_credentials():
+    """
+    Return (endpoint, key) of the AZURE_OPENAI_ENDPOINT resource. Raises ValueError if either is
+    missing, at the first request rather than on import, so the module can be imported without them.
+    """
+    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT") or os.getenv("AZURE_ENDPOINT")
+    api_key = os.getenv("AZURE_OPENAI_API_KEY") or os.getenv("AZURE_OPENAI_KEY")
+    if not api_key:
+        raise ValueError("AZURE_OPENAI_API_KEY not found in environment variables")
+    if not azure_endpoint:
+        raise ValueError("AZURE_OPENAI_ENDPOINT not found in environment variables")
+    return azure_endpoint, api_key
+
+
+def get_client():
+    """Return the shared client for AZURE_OPENAI_ENDPOINT, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = make_client(*_default_credentials())
+    return _client
+
+
+def get_batch_client():
+    """Return a client for batch jobs on AZURE_OPENAI_ENDPOINT, which need a newer API version."""
+    return make_client(*_default_credentials(), BATCH_API_VERSION)
+
+
+def get_pool():
+    """
+    Return the shared endpoint pool, creating it on first use: the endpoints in ENDPOINTS_PATH, or
+    the single AZURE_OPENAI_ENDPOINT resource serving every deployment name under its own quota.
+    """
+    global _pool
+    if _pool is None:
+        with _client_lock:
+            if _pool is None:
+                if os.path.exists(ENDPOINTS_PATH):
+                    endpoints = load_endpoints(ENDPOINTS_PATH, make_client, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+                else:
+                    endpoints = [Endpoint("default", get_client, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)]
+                _pool = EndpointPool(endpoints)
+    return _pool
+
+
+def get_cache():
+    """Return the shared translation cache, or None when caching is disabled."""
+    global _cache
+    if _cache is None and CACHE_PATH:
+        with _client_lock:
+            if _cache is None:
+                _cache = TranslationCache(CACHE_PATH, CACHE_MAX_BYTES, FILTER_TTL)
+    return _cache
+
+
+def skip_known_filtered(texts, deployment_name, skipped_record):
+    """
+    Return True, recording the entry as skipped, if the content filter rejected these input texts
+    in an earlier request (see TranslationCache.is_filtered); sending them again would only use quota.
+    """
+    cache = get_cache()
+    if cache is None or not cache.is_filtered(filter_key(texts, deployment_name)):
+        return False
+    logger.warning(f"Content filter triggered earlier for {skipped_record}. Skipping entry without a request.")
+    get_sink(SKIPPED_PATH).write(skipped_record, ERROR_CONTENT_FILTER, "Content filter (cached)")
+    return True
+
+
+def record_filtered(texts, deployment_name, skipped_record, error):
+    """Record an entry rejected by the content filter as skipped, and its input texts in the negative cache."""
+    logger.error(f"Content filter triggered for {skipped_record}. Skipping entry.")
+    get_sink(SKIPPED_PATH).write(skipped_record, ERROR_CONTENT_FILTER, error)
+    cache = get_cache()
+    if cache is not None:
+        cache.mark_filtered(filter_key(texts, deployment_name))
+
+
+def _chat_with_retries(chat_prompt, max_tokens, deployment_name, max_retries, parse, skipped_record, texts):
+    """
+    Send a chat request to an endpoint of the pool, through that endpoint's rate limiter, retrying
+    empty or unparseable replies and API errors with exponential backoff. A retry after an API error
+    goes to an endpoint that has not failed it yet, if one is available. parse(content) returns the
+    parsed result or None. Inputs (texts) the content filter rejected in an earlier request are
+    skipped without one.
+    Returns the parsed result, or None when the content filter fired. Raises TranslationError when
+    every attempt failed, so the failure is not mistaken for a reply.
+    """
+    from openai import OpenAIError, RateLimitError, BadRequestError
+    metrics = get_metrics()
+    if skip_known_filtered(texts, deployment_name, skipped_record):
+        metrics.incr("api.filter_skips")
+        return None
+
+    pool = get_pool()
+    estimated_tokens = estimate_tokens(chat_prompt, max_tokens)
+    failed = set()
+
+    called = time.perf_counter()
+    try:
+        for attempt in range(max_retries):
+            if attempt:
+                metrics.incr("api.retries")
+            start = time.perf_counter()
+            endpoint, trial = pool.acquire(deployment_name, exclude=failed)
+            limiter = endpoint.rate_limiter
+            try:
+                limiter.acquire(estimated_tokens)
+                sent = time.perf_counter()
+                metrics.observe("api.wait_s", sent - start)  # Waiting on open breakers and the rate limiter
+                metrics.incr("api.requests")
+                try:
+                    completion = endpoint.client.chat.completions.create(
+                        model=endpoint.deployment_for(deployment_name),
+                        messages=chat_prompt,
+                        max_tokens=max_tokens,
+                        temperature=TEMPERATURE
+                    )
+                finally:
+                    metrics.observe("api.latency_s", time.perf_counter() - sent)
+            except OpenAIError as e:
+                if "content_filter" in str(e).lower():
+                    metrics.incr("api.content_filtered")
+                    pool.release(endpoint, trial)
+                    record_filtered(texts, deployment_name, skipped_record, e)
+                    return None
+                failed.add(endpoint)
+                if isinstance(e, RateLimitError) or "429" in str(e) or "Too Many Requests" in str(e):
+                    metrics.incr("api.rate_limited")
+                    # The endpoint's breaker opens and its limiter pauses until Retry-After, slowing its
+                    # refill rate; the retry goes to another endpoint if there is one
+                    retry_after = get_retry_after(e)
+                    pool.release(endpoint, trial, rate_limited=True, retry_after=retry_after)
+                    limiter.on_rate_limited(retry_after)
+                    continue
+                # A rejected request says nothing about the endpoint's health; anything else counts toward its breaker
+                metrics.incr("api.errors")
+                pool.release(endpoint, trial, success=isinstance(e, BadRequestError))
+                if attempt < max_retries - 1:
+                    logger.error(f"API error on attempt {attempt + 1} ({endpoint.name}): {e}")
+                    if not pool.has_alternative(endpoint, deployment_name):
+                        time.sleep(2 ** attempt)  # Exponential backoff
+                    continue
+                metrics.incr("api.failures")
+                raise TranslationError(f"Max retries reached for error: {e}") from e
+            except Exception:
+                pool.release(endpoint, trial, success=False)
+                raise
+
+            pool.release(endpoint, trial)
+            limiter.on_success()
+            usage = getattr(completion, "usage", None)
+            limiter.settle(estimated_tokens, getattr(usage, "total_tokens", None))
+            metrics.incr("api.tokens", getattr(usage, "total_tokens", None) or 0)
+            content = completion.choices[0].message.content if completion.choices else None
+            result = parse(content) if content else None
+            if result is not None:
+                return result
+            metrics.incr("api.unparseable")
+            logger.warning(f"Empty or unparseable response content on attempt {attempt + 1}")
+            if attempt < max_retries - 1:
+                time.sleep(2 ** attempt)  # Exponential backoff
+        metrics.incr("api.failures")
+        raise TranslationError(f"No usable reply after {max_retries} attempts (rate limited or unparseable)")
+    finally:
+        # Client-side time of the whole call: breaker and rate limiter waits, retries and back-offs included
+        metrics.observe("api.call_s", time.perf_counter() - called)
+
+
+def parse_translation(content, prompt, response):
+    """
+    Parse a "Prompt: ... / Response: ..." reply. Missing lines fall back to the English input.
+    Returns (arabizi_prompt, arabizi_response, complete).
+    """
+    lines = content.strip().split("\n")
+    arabizi_prompt = lines[0].replace("Prompt:", "").strip() if len(lines) > 0 else prompt
+    arabizi_response = lines[1].replace("Response:", "").strip() if len(lines) > 1 else response
+    return arabizi_prompt, arabizi_response, len(lines) > 1
+
+
+def pair_chat_prompt(prompt, response):
+    """Chat messages asking for the translation of one prompt-response pair."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": f"Prompt: {prompt}\nResponse: {response}"}
     ]
 
-    for attempt in range(max_retries):
+
+def translate_with_gpt(prompt, response, deployment_name=DEFAULT_DEPLOYMENT, max_retries=3):
+    """
+    Translate English prompt and response to Lebanese Arabizi using Azure OpenAI API.
+    Successful translations are stored in the on-disk cache, so repeated inputs are free.
+    Returns tuple of (arabizi_prompt, arabizi_response), the English input itself if the content
+    filter rejected it. Raises TranslationError if every attempt failed.
+    """
+    cache = get_cache()
+    cache_key = make_key([prompt, response], SYSTEM_PROMPT, deployment_name, TEMPERATURE)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+
+    chat_prompt = pair_chat_prompt(prompt, response)
+    result = _chat_with_retries(chat_prompt, MAX_TOKENS, deployment_name, max_retries,
+                                lambda content: parse_translation(content, prompt, response),
+                                {"prompt": prompt, "response": response}, [prompt, response])
+    if result is None:
+        return prompt, response
+
+    arabizi_prompt, arabizi_response, complete = result
+    if cache is not None and complete:
+        cache.put(cache_key, [arabizi_prompt, arabizi_response])
+    return arabizi_prompt, arabizi_response
+
+
+def parse_dialog_translation(content, num_turns):
+    """
+    Parse a numbered reply ("1. ...", "2. ...") into a list of num_turns translated turns.
+    Returns None unless every turn number from 1 to num_turns is present.
+    """
+    turns = {}
+    for line in content.strip().split("\n"):
+        match = re.match(r"^\s*(\d+)\s*[.):-]\s*(.*)$", line)
+        if match and match.group(2).strip():
+            turns.setdefault(int(match.group(1)), match.group(2).strip())
+    if all(number in turns for number in range(1, num_turns + 1)):
+        return [turns[number] for number in range(1, num_turns + 1)]
+    return None
+
+
+def translate_dialog(turns, deployment_name=DEFAULT_DEPLOYMENT, max_retries=3, max_turns=DIALOG_MAX_TURNS):
+    """
+    Translate every turn of an English dialog to Lebanese Arabizi, each turn exactly once.
+    Turns are sent together (up to max_turns per request) so wording stays consistent across turns.
+    Returns the list of translated turns, or None if the content filter rejected a chunk.
+    Raises TranslationError if a chunk could not be translated.
+    """
+    translated = []
+    for start in range(0, len(turns), max_turns):
+        chunk = list(turns[start:start + max_turns])
+        cache = get_cache()
+        cache_key = make_key(chunk, DIALOG_SYSTEM_PROMPT, deployment_name, TEMPERATURE)
+        cached = cache.get(cache_key) if cache is not None else None
+        if cached is not None:
+            translated.extend(cached)
+            continue
+
+        # One line per turn: embedded newlines would break the numbered reply format
+        numbered = "\n".join(f"{number}. {' '.join(turn.split())}" for number, turn in enumerate(chunk, 1))
+        chat_prompt = [
+            {"role": "system", "content": DIALOG_SYSTEM_PROMPT},
+            {"role": "user", "content": numbered}
+        ]
+        result = _chat_with_retries(chat_prompt, MAX_TOKENS_PER_TURN * len(chunk), deployment_name, max_retries,
+                                    lambda content: parse_dialog_translation(content, len(chunk)),
+                                    {"dialog": chunk}, chunk)
+        if result is None:
+            return None
+        if cache is not None:
+            cache.put(cache_key, result)
+        translated.extend(result)
+    return translated
+
+
+def _estimate_pair_tokens(prompt, response):
+    """Rough (input, output) token estimate for one pair inside a packed request."""
+    input_tokens = (len(prompt) + len(response)) // 4 + 20
+    return input_tokens, input_tokens + input_tokens // 2 + 10
+
+
+def plan_batches(pairs, token_budget=BATCH_TOKEN_BUDGET, max_pairs=BATCH_MAX_PAIRS):
+    """
+    Split pairs into consecutive batches whose estimated input plus output tokens stay within
+    token_budget, with at most max_pairs pairs each. Returns lists of indices into pairs.
+    """
+    batches, current, used = [], [], 0
+    for index, (prompt, response) in enumerate(pairs):
+        cost = sum(_estimate_pair_tokens(prompt, response))
+        if current and (used + cost > token_budget or len(current) >= max_pairs):
+            batches.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_translation(content, ids):
+    """
+    Parse a packed JSON reply into {id: (arabizi_prompt, arabizi_response)} for the expected ids.
+    Tolerates code fences and surrounding text; when the array itself is malformed, recovers the
+    individual objects that still parse. Returns None if no expected id could be recovered.
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", content.strip(), flags=re.MULTILINE).strip()
+    start, end = text.find("["), text.rfind("]")
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        items = []
+        for match in re.finditer(r"\{[^{}]*\}", text):
+            try:
+                items.append(json.loads(match.group(0)))
+            except json.JSONDecodeError:
+                continue
+
+    expected = set(ids)
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        item_id, prompt, response = item.get("id"), item.get("prompt"), item.get("response")
+        if item_id in expected and isinstance(prompt, str) and isinstance(response, str) \
+                and prompt.strip() and response.strip():
+            results.setdefault(item_id, (prompt.strip(), response.strip()))
+    return results or None
+
+
+def translate_batch(pairs, deployment_name=DEFAULT_DEPLOYMENT, max_retries=3, token_budget=BATCH_TOKEN_BUDGET,
+                    max_pairs=BATCH_MAX_PAIRS):
+    """
+    Translate many (prompt, response) pairs by packing them into as few requests as the token
+    budget allows, so the system prompt is paid once per batch instead of once per pair.
+    Pairs missing from a reply fall back to translate_with_gpt.
+    Returns a list of (arabizi_prompt, arabizi_response) tuples in input order, with the
+    TranslationError in place of a pair whose fallback failed too.
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    results = [None] * len(pairs)
+    cache = get_cache()
+    cache_keys = [make_key(pair, BATCH_SYSTEM_PROMPT, deployment_name, TEMPERATURE) for pair in pairs]
+    if cache is not None:
+        for index, key in enumerate(cache_keys):
+            cached = cache.get(key)
+            if cached is not None:
+                results[index] = tuple(cached)
+
+    # A pair the content filter rejected before would get its whole packed request rejected, so it is
+    # left out and returned untranslated, as translate_with_gpt does
+    for index, result in enumerate(results):
+        if result is None and skip_known_filtered(pairs[index], deployment_name,
+                                                  {"prompt": pairs[index][0], "response": pairs[index][1]}):
+            results[index] = pairs[index]
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    for batch in plan_batches([pairs[index] for index in pending], token_budget, max_pairs):
+        indices = [pending[position] for position in batch]
+        payload = [{"id": number, "prompt": pairs[index][0], "response": pairs[index][1]}
+                   for number, index in enumerate(indices, 1)]
+        chat_prompt = [
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)}
+        ]
+        max_tokens = sum(_estimate_pair_tokens(*pairs[index])[1] for index in indices)
+        ids = list(range(1, len(indices) + 1))
         try:
-            response = client.chat.completions.create(
-                model=deployment_name,
-                messages=chat_prompt,
-                max_tokens=150,
-                temperature=0.5
-            )
-            content = response.choices[0].message.content if response.choices else None
-            if content:
-                lines = content.strip().split("\n")
-                arabizi_prompt = lines[0].replace("Prompt:", "").strip() if len(lines) > 0 else prompt
-                arabizi_response = lines[1].replace("Response:", "").strip() if len(lines) > 1 else response
-                return arabizi_prompt, arabizi_response
-            else:
-                logger.warning(f"Empty response content on attempt {attempt + 1}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
-                    logger.error("Max retries reached with empty response. Skipping entry.")
-                    return prompt, response
-        except OpenAIError as e:
-            if "content_filter" in str(e).lower():
-                logger.error(f"Content filter triggered for prompt: '{prompt}'. Skipping entry.")
-                with open("../data/corrected/skipped_entries.jsonl", "a", encoding='utf-8') as f:
-                    json.dump({"prompt": prompt, "response": response, "error": str(e)}, f, ensure_ascii=False)
-                    f.write("\n")
-                return prompt, response
-            elif "429" in str(e) or "Too Many Requests" in str(e):
-                retry_after = getattr(e, "retry_after", 10)  # Default to 10s
-                logger.info(f"Rate limit hit, retrying after {retry_after} seconds")
-                time.sleep(retry_after)
-            elif attempt < max_retries - 1:
-                logger.error(f"API error on attempt {attempt + 1}: {e}")
-                time.sleep(2 ** attempt)  # Exponential backoff
-            else:
-                logger.error(f"Max retries reached for error: {e}. Skipping entry.")
-                return prompt, response
-        time.sleep(2)  # Delay between requests to avoid rate limits
+            parsed = _chat_with_retries(chat_prompt, max_tokens, deployment_name, max_retries,
+                                        lambda content: parse_batch_translation(content, ids),
+                                        {"batch": [pairs[index] for index in indices]},
+                                        [text for index in indices for text in pairs[index]]) or {}
+        except TranslationError as e:
+            logger.error(f"Packed request failed: {e}")
+            parsed = {}
+        for number, index in enumerate(indices, 1):
+            if number in parsed:
+                results[index] = parsed[number]
+                if cache is not None:
+                    cache.put(cache_keys[index], list(parsed[number]))
+
+        missing = [index for index in indices if results[index] is None]
+        if missing:
+            logger.warning(f"Packed reply missed {len(missing)} of {len(indices)} pairs; translating them one by one")
+            for index in missing:
+                results[index] = _translate_or_error(pairs[index], deployment_name, max_retries)
+    return results
+
+
+def _translate_or_error(pair, deployment_name, max_retries):
+    """translate_with_gpt(), returning the TranslationError instead of raising it."""
+    try:
+        return translate_with_gpt(*pair, deployment_name=deployment_name, max_retries=max_retries)
+    except TranslationError as e:
+        return e
+
+
+def translate_with_batch_job(pairs, deployment_name=DEFAULT_DEPLOYMENT, max_retries=3,
+                             poll_interval=BATCH_POLL_INTERVAL):
+    """
+    Translate many (prompt, response) pairs with one offline batch job: every pair not in the cache
+    becomes a translate_with_gpt request in a batch input file, the job is submitted and polled until
+    it completes, and replies are merged back by custom id and parsed like translate_with_gpt's.
+    Batch jobs are slower to finish but cheaper per token and do not use the per-minute quota.
+    Pairs without a usable reply fall back to translate_with_gpt; content-filtered ones come back
+    untranslated. Returns a list of (arabizi_prompt, arabizi_response) tuples in input order, with the
+    TranslationError in place of a pair whose fallback failed too.
+    """
+    pairs = [tuple(pair) for pair in pairs]
+    results = [None] * len(pairs)
+    cache = get_cache()
+    # Same keys as translate_with_gpt: both send the same request for a pair
+    cache_keys = [make_key(pair, SYSTEM_PROMPT, deployment_name, TEMPERATURE) for pair in pairs]
+    for index, pair in enumerate(pairs):
+        cached = cache.get(cache_keys[index]) if cache is not None else None
+        if cached is not None:
+            results[index] = tuple(cached)
+        elif skip_known_filtered(pair, deployment_name, {"prompt": pair[0], "response": pair[1]}):
+            results[index] = pair
+
+    pending = [index for index, result in enumerate(results) if result is None]
+    if not pending:
+        return results
+    requests = [(f"pair-{index}", {"model": BATCH_DEPLOYMENT or deployment_name,
+                                   "messages": pair_chat_prompt(*pairs[index]),
+                                   "max_tokens": MAX_TOKENS, "temperature": TEMPERATURE})
+                for index in pending]
+    from openai import OpenAIError
+    metrics = get_metrics()
+    metrics.incr("batch.requests", len(requests))
+    try:
+        with metrics.timer("batch.job", records=len(requests)):
+            replies = batch_job.run(get_batch_client(), requests, BATCH_DIR, poll_interval)
+    except (OpenAIError, BatchJobError) as e:
+        metrics.incr("batch.failed_jobs")
+        logger.error(f"Batch job failed: {e}. Translating its {len(pending)} pairs one by one")
+        replies = {}
+
+    fallback = 0
+    for index in pending:
+        prompt, response = pairs[index]
+        content, error = replies.get(f"pair-{index}", (None, None))
+        if content:
+            arabizi_prompt, arabizi_response, complete = parse_translation(content, prompt, response)
+            if complete:
+                results[index] = arabizi_prompt, arabizi_response
+                if cache is not None:
+                    cache.put(cache_keys[index], [arabizi_prompt, arabizi_response])
+                continue
+        if error and "content_filter" in error.lower():
+            record_filtered([prompt, response], deployment_name, {"prompt": prompt, "response": response}, error)
+            results[index] = prompt, response
+            continue
+        fallback += 1
+        results[index] = _translate_or_error(pairs[index], deployment_name, max_retries)
+    if fallback:
+        metrics.incr("batch.fallbacks", fallback)
+        logger.warning(f"Batch job had no usable reply for {fallback} of {len(pending)} pairs; "
+                       f"translated them one by one")
+    return results
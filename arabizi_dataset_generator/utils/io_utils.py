@@ -0,0 +1,146 @@
+import json
+import os
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Format of the files the stage scripts hand to each other: "json" (indented array), "jsonl" or "parquet"
+STAGE_FORMAT = os.getenv("ARABIZI_STAGE_FORMAT", "json")
+ROW_GROUP_SIZE = 10000  # Records per Parquet row group, and per batch when reading one
+SUFFIXES = {".json": "json", ".jsonl": "jsonl", ".parquet": "parquet"}
+
+
+def stage_path(path, fmt=None):
+    """Path of an intermediate stage file in STAGE_FORMAT (or fmt): the same name with that format's suffix."""
+    fmt = fmt or STAGE_FORMAT
+    if fmt not in SUFFIXES.values():
+        raise ValueError(f"Unsupported stage format: {fmt}")
+    return str(Path(path).with_suffix(f".{fmt}"))
+
+
+def file_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix not in SUFFIXES:
+        raise ValueError(f"Unsupported file format: {suffix}")
+    return SUFFIXES[suffix]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet stage files need pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def iter_records(path, batch_size=ROW_GROUP_SIZE):
+    """
+    Stream the records (dicts) of a .json array, .jsonl or .parquet file.
+    JSON arrays are parsed incrementally when ijson is installed; Parquet is read one batch at a time.
+    """
+    fmt = file_format(path)
+    if fmt == "jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        pa = _import_pyarrow()
+        # Open the file ourselves: pyarrow would read a Windows drive letter as a URI scheme
+        with open(path, "rb") as f:
+            for batch in pa.parquet.ParquetFile(f).iter_batches(batch_size=batch_size):
+                yield from batch.to_pylist()
+    else:
+        try:
+            import ijson
+        except ImportError:
+            with open(path, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+            return
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+
+
+class RecordWriter:
+    """
+    Streaming writer for a .json array, .jsonl or .parquet file, chosen by the path's suffix.
+    Records go to a temporary file that replaces `path` on a clean close(), so readers (and the stage
+    manifest) never see a half-written file. JSON output is byte-for-byte what json.dump(records, indent=2)
+    writes. Parquet output is written in row groups of row_group_size; nested lists, such as the
+    variants of an entry, become list columns.
+    """
+
+    def __init__(self, path, row_group_size=ROW_GROUP_SIZE):
+        self.path = Path(path)
+        self.format = file_format(path)
+        self.row_group_size = row_group_size
+        self.count = 0
+        self._tmp_path = Path(f"{self.path}.tmp")
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._rows = []
+        self._parquet = None
+        self._schema = None
+        if self.format == "parquet":
+            self._pa = _import_pyarrow()
+            self._file = None
+        else:
+            self._file = open(self._tmp_path, "w", encoding="utf-8")
+            if self.format == "json":
+                self._file.write("[")
+
+    def write(self, record):
+        if self.format == "jsonl":
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        elif self.format == "json":
+            # Indent the record one level; split on "\n" only, as JSON escapes it inside strings
+            lines = json.dumps(record, indent=2, ensure_ascii=False).split("\n")
+            self._file.write(("," if self.count else "") + "\n  " + "\n  ".join(lines))
+        else:
+            self._rows.append(record)
+            if len(self._rows) >= self.row_group_size:
+                self._write_row_group()
+        self.count += 1
+
+    def _write_row_group(self):
+        pa = self._pa
+        table = pa.Table.from_pylist(self._rows, schema=self._schema)
+        if self._parquet is None:
+            self._schema = table.schema
+            self._file = open(self._tmp_path, "wb")
+            self._parquet = pa.parquet.ParquetWriter(self._file, self._schema)
+        self._parquet.write_table(table, row_group_size=self.row_group_size)
+        self._rows = []
+
+    def close(self):
+        """Finish the file and move it into place."""
+        if self.format == "parquet":
+            if self._rows or self._parquet is None:
+                self._write_row_group()
+            self._parquet.close()
+            self._file.close()
+        else:
+            if self.format == "json":
+                self._file.write("\n]" if self.count else "]")
+            self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Drop the partial output, leaving any previous file at `path` untouched."""
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None:
+            self._file.close()
+        if self._tmp_path.exists():
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import logging
+from pathlib import Path
+from utils.io_utils import iter_records
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_digest(record):
+    """SHA-256 of a JSON-serializable record, independent of key order."""
+    data = json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class StageManifest:
+    """
+    Manifest of one pipeline stage, stored next to its output as "<output>.manifest.json".
+    It records digests of the stage's input file, output file and dependencies (rule files, code, params),
+    plus the digest of the input record behind every output record, in output order. On the next run:
+    - is_fresh() tells whether nothing changed, so the whole stage can be skipped;
+    - lookup() returns the previous output for an input record that is unchanged and whose
+      dependencies are unchanged, so only new or affected records are recomputed.
+    deps maps names to files whose contents the stage depends on; params holds other settings.
+    When the stage passes `rules` (pattern -> replacement) and `affected_check`, a rule edit does not
+    invalidate every record: affected_check(changed_patterns) returns a predicate over previous output
+    records, and the records it clears are still reused.
+    """
+
+    def __init__(self, output_path, deps=None, params=None, rules=None, affected_check=None):
+        self.output_path = Path(output_path)
+        self.path = Path(f"{self.output_path}.manifest.json")
+        self.deps = {name: file_digest(path) for name, path in (deps or {}).items()}
+        if params:
+            self.deps["params"] = record_digest(params)
+        self.rules = {pattern: record_digest(replacement) for pattern, replacement in (rules or {}).items()}
+        self.affected_check = affected_check
+        self.records = []
+        self.reused = 0
+        self.previous = self._load()
+        self._outputs = None
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return previous if previous.get("version") == MANIFEST_VERSION else {}
+
+    def changed_rules(self):
+        """Patterns added, removed or given a different replacement since the previous run."""
+        old = self.previous.get("rules", {})
+        return {pattern for pattern in old.keys() | self.rules.keys() if old.get(pattern) != self.rules.get(pattern)}
+
+    def is_fresh(self, input_path):
+        """True if the input, dependencies and rules are unchanged and the output is the one last written."""
+        return (bool(self.previous)
+                and self.previous.get("deps") == self.deps
+                and self.previous.get("rules", {}) == self.rules
+                and self.previous.get("input") == file_digest(input_path)
+                and self.previous.get("output") == file_digest(self.output_path))
+
+    def _previous_outputs(self):
+        """Map input record digest -> previous output record, for records still valid under the current deps."""
+        if self._outputs is not None:
+            return self._outputs
+        self._outputs = {}
+        previous_records = self.previous.get("records")
+        if (not previous_records or self.previous.get("deps") != self.deps
+                or self.previous.get("output") != file_digest(self.output_path)):
+            return self._outputs
+        changed = self.changed_rules()
+        if changed and self.affected_check is None:
+            return self._outputs
+        is_affected = self.affected_check(changed) if changed else None
+        try:
+            for digest, output in zip(previous_records, iter_records(self.output_path)):
+                if is_affected is None or not is_affected(output):
+                    self._outputs[digest] = output
+        except Exception as e:
+            logger.warning(f"Cannot reuse previous output {self.output_path}: {e}")
+            self._outputs = {}
+        return self._outputs
+
+    def lookup(self, record):
+        """Return (digest, previous output or None) for an input record."""
+        digest = record_digest(record)
+        output = self._previous_outputs().get(digest)
+        if output is not None:
+            self.reused += 1
+        return digest, output
+
+    def add(self, digest):
+        """Record the input digest behind the next output record."""
+        self.records.append(digest)
+
+    def save(self, input_path):
+        os.makedirs(self.path.parent, exist_ok=True)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "input": file_digest(input_path),
+            "output": file_digest(self.output_path),
+            "deps": self.deps,
+            "rules": self.rules,
+            "records": self.records,
+        }
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
@@ -0,0 +1,261 @@
+"""
+Lightweight run metrics: per-stage wall and CPU time and records/sec, counters (requests, retries,
+429s, ...), latency histograms and gauges (e.g. cache stats), written as a JSON report at the end of a run.
+Instrumented code records into the process-wide registry from get_metrics():
+    metrics = get_metrics()
+    with metrics.timer("postprocess.variants", records=len(chunk)):
+        ...
+    metrics.incr("api.rate_limited")
+    metrics.observe("api.latency_s", elapsed)
+Timers cost a few microseconds, so they wrap chunks, requests and stages, not single texts.
+
+Stages run under stage(name), or a stage's main() decorated with instrumented_stage(name), which also
+writes the report when it returns. They are timed with process CPU and, if profiling is enabled for the
+name (enable_profiling(), or ARABIZI_PROFILE=name,name... or "all"), under cProfile: the stats are dumped
+to profile_<name>.prof in the metrics directory, with the top functions in profile_<name>.txt.
+cProfile only sees the thread it runs in; work done by thread pools shows up as waiting on them.
+"""
+import bisect
+import functools
+import io
+import json
+import math
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRICS_DIR = Path(__file__).resolve().parent.parent / "logs"
+METRICS_DIR = os.getenv("ARABIZI_METRICS_DIR", str(DEFAULT_METRICS_DIR))
+# Bucket upper bounds of the histograms: 1 ms to about 2 minutes, 4 buckets per doubling
+HISTOGRAM_BOUNDS = [0.001 * 2 ** (i / 4) for i in range(69)]
+PROFILE_TOP = 30  # Functions listed in the text summary of a profile
+
+
+class Histogram:
+    """Counts of observed values in HISTOGRAM_BOUNDS buckets, plus count, sum, min and max; mergeable."""
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)  # The last bucket holds values above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other["counts"])]
+        self.count += other["count"]
+        self.sum += other["sum"]
+        self.min = min(self.min, other["min"])
+        self.max = max(self.max, other["max"])
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (capped at the largest value seen)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def state(self):
+        return {"counts": list(self.counts), "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.sum / self.count, "min": self.min, "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9), "p99": self.quantile(0.99), "max": self.max}
+
+
+class Metrics:
+    """Registry of counters, gauges, timers and histograms. Safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profile = {name.strip() for name in os.getenv("ARABIZI_PROFILE", "").split(",") if name.strip()}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters = {}
+            self.gauges = {}
+            self.timers = {}  # name -> [calls, wall seconds, CPU seconds, records]
+            self.histograms = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def record_time(self, name, wall, cpu, records=0):
+        with self._lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0, 0])
+            timer[0] += 1
+            timer[1] += wall
+            timer[2] += cpu
+            timer[3] += records
+
+    def add_records(self, name, records):
+        """Count records processed under the timer or stage `name`, for when they are only known outside it."""
+        with self._lock:
+            self.timers.setdefault(name, [0, 0.0, 0.0, 0])[3] += records
+
+    @contextmanager
+    def timer(self, name, records=0, cpu_clock=time.thread_time):
+        """
+        Time the block: wall time, CPU time of the calling thread (or cpu_clock) and `records` processed.
+        The yielded dict's "records" can be set inside the block when the count is only known then.
+        """
+        timing = {"records": records}
+        start, cpu_start = time.perf_counter(), cpu_clock()
+        try:
+            yield timing
+        finally:
+            self.record_time(name, time.perf_counter() - start, cpu_clock() - cpu_start, timing["records"])
+
+    def enable_profiling(self, names):
+        self._profile.update(names)
+
+    def is_profiled(self, name):
+        return name in self._profile or "all" in self._profile
+
+    @contextmanager
+    def stage(self, name, records=0):
+        """timer() for a whole stage, with process CPU time (all threads), profiled if enabled for name."""
+        profiler = None
+        if self.is_profiled(name):
+            import cProfile  # Imported only when profiling, like pstats in dump_profile()
+            profiler = cProfile.Profile()
+        with self.timer(name, records, cpu_clock=time.process_time) as timing:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield timing
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    dump_profile(profiler, name)
+
+    def _snapshot(self):
+        return {"counters": dict(self.counters), "timers": {k: list(v) for k, v in self.timers.items()},
+                "histograms": {k: h.state() for k, h in self.histograms.items()}}
+
+    def snapshot(self):
+        """Picklable copy of the collected metrics, e.g. to send from a worker process to merge()."""
+        with self._lock:
+            return self._snapshot()
+
+    def drain(self):
+        """snapshot(), then clear what it holds."""
+        with self._lock:
+            snapshot = self._snapshot()
+            self.counters, self.timers, self.histograms = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a snapshot()'s counters, timers and histograms to this registry."""
+        with self._lock:
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, values in snapshot["timers"].items():
+                timer = self.timers.setdefault(name, [0, 0.0, 0.0, 0])
+                for index, value in enumerate(values):
+                    timer[index] += value
+            for name, state in snapshot["histograms"].items():
+                self.histograms.setdefault(name, Histogram()).merge(state)
+
+    def report(self):
+        with self._lock:
+            stages = {}
+            for name, (calls, wall, cpu, records) in sorted(self.timers.items()):
+                stages[name] = {"calls": calls, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6), "records": records,
+                                "records_per_s": round(records / wall, 3) if records and wall > 0 else None}
+            return {
+                "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+                "finished": datetime.now(timezone.utc).isoformat(),
+                "wall_s": round(time.time() - self.started, 6),
+                "stages": stages,
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+                "gauges": dict(sorted(self.gauges.items())),
+            }
+
+    def write_report(self, name, metrics_dir=None):
+        """Write report() to metrics_<name>.json in metrics_dir (default METRICS_DIR). Returns the path."""
+        path = Path(metrics_dir or METRICS_DIR) / f"metrics_{name}.json"
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False, default=str)
+        logger.info(f"Wrote metrics report to {path}")
+        return path
+
+
+def dump_profile(profiler, name, metrics_dir=None):
+    """Save a profile's stats to profile_<name>.prof and its top functions by cumulative time to profile_<name>.txt."""
+    import pstats
+    directory = Path(metrics_dir or METRICS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(directory / f"profile_{name}.prof")
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP)
+    with open(directory / f"profile_{name}.txt", "w", encoding="utf-8") as f:
+        f.write(summary.getvalue())
+    logger.info(f"Wrote profile of {name} to {directory / f'profile_{name}.prof'}")
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """Return the process-wide metrics registry."""
+    return _metrics
+
+
+def instrumented_stage(name):
+    """
+    Decorator for a stage's main(): runs it under get_metrics().stage(name) and writes metrics_<name>.json
+    when it returns or fails. The report covers the whole process so far, so when several stages run in
+    one process (scripts/run_pipeline.py), each report includes the stages before it.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            try:
+                with metrics.stage(name):
+                    return fn(*args, **kwargs)
+            finally:
+                try:
+                    metrics.write_report(name)
+                except OSError as e:
+                    logger.error(f"Failed to write metrics report for {name}: {e}")
+        return wrapper
+    return decorate
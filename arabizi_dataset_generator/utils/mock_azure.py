@@ -0,0 +1,319 @@
+"""
+Local stand-in for the Azure OpenAI endpoints the translator uses: chat completions, file uploads and
+batch jobs. Replies come from a word-for-word fake translator that understands the pair, dialog and
+packed prompt formats of utils/gpt_api.py, so the pipeline can be run and tested offline.
+Chat requests can be slowed down by a simulated latency, and a share of them answered with a 429 or a
+content filter rejection, to exercise the retry, rate limiting and skipping paths.
+
+Run from the project root:
+    python -m utils.mock_azure [--port 8000] [--batch-seconds 0.5] [--latency 0.2] [--rate-limit-rate 0.05]
+then point the translator at it:
+    AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8000 AZURE_OPENAI_API_KEY=mock python main.py
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import logging
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+WORDS = {
+    "hello": "marhaba", "hi": "hi", "hey": "ahla", "bye": "bye", "goodbye": "ma3 el salame", "thanks": "merci",
+    "thank": "shukran", "you": "enta", "yes": "eh", "no": "la2", "ok": "tayeb", "okay": "tayeb", "what": "shou",
+    "how": "kif", "why": "leh", "where": "wein", "when": "emta", "who": "min", "good": "mni7", "great": "ktir 7elo",
+    "i": "ana", "we": "ne7na", "they": "hene", "my": "tabi3i", "is": "", "are": "", "the": "el", "a": "",
+    "and": "w", "or": "aw", "not": "mish", "want": "baddi", "like": "b7eb", "please": "iza bet reed",
+    "sorry": "3afwan", "friend": "sa7be", "today": "lyom", "tomorrow": "bokra", "now": "halla2",
+    "very": "ktir", "much": "ktir", "money": "msari", "work": "shoghl", "home": "beit", "food": "akel",
+}
+# Stand-ins for the words WORDS does not know, so replies read as Arabizi to utils/arabizi_scorer.py
+FILLER = ["shi", "ktir", "ya3ni", "halla2", "3am", "7elo", "baddi", "ma3", "kel", "hek", "sa7", "bel", "3al",
+          "mni7", "ba3den", "khalas", "yalla", "wallah", "kamen", "hayda", "3ande", "ma fi", "tab3an", "2abel"]
+_PUNCTUATION = ".,!?'\""
+_ids = itertools.count(1)
+
+
+def fake_arabizi(text):
+    """Deterministic stand-in translation: common words mapped, every other word to a FILLER word chosen by its hash."""
+    words = []
+    for word in text.split():
+        word = word.lower().strip(_PUNCTUATION)
+        if word in WORDS:
+            words.append(WORDS[word])
+        elif word:
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=4).digest()
+            words.append(FILLER[int.from_bytes(digest, "big") % len(FILLER)])
+    return " ".join(word for word in words if word) or "sa7"
+
+
+def fake_reply(messages):
+    """The reply the translator would get for a chat request, in the format its system prompt asks for."""
+    text = messages[-1]["content"] if messages else ""
+    if text.startswith("Prompt:"):
+        prompt, _, response = text.partition("\nResponse:")
+        return f"Prompt: {fake_arabizi(prompt[len('Prompt:'):])}\nResponse: {fake_arabizi(response)}"
+    if re.match(r"^\d+\.\s", text):
+        return "\n".join(re.sub(r"^(\d+)\.\s*(.*)$", lambda m: f"{m.group(1)}. {fake_arabizi(m.group(2))}", line)
+                         for line in text.split("\n"))
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+        return json.dumps([{"id": item["id"], "prompt": fake_arabizi(item["prompt"]),
+                            "response": fake_arabizi(item["response"])} for item in items], ensure_ascii=False)
+    return fake_arabizi(text)
+
+
+def _content_filter_error():
+    return {"error": {
+        "code": "content_filter", "param": "prompt", "status": 400, "type": None,
+        "message": "The response was filtered due to the prompt triggering Azure OpenAI's content management "
+                   "policy. (mock)",
+        "innererror": {"code": "ResponsibleAIPolicyViolation",
+                       "content_filter_result": {"violence": {"filtered": True, "severity": "medium"}}},
+    }}
+
+
+class MockAzure:
+    """
+    State and behaviour of the stand-in service. complete(body) answers one chat completions request
+    with (status, reply body); batch jobs run the same method over every line of their input file.
+    chat(body) is the HTTP endpoint's version: it first waits latency seconds (normally distributed
+    with standard deviation jitter) and answers rate_limit_rate of the requests with a 429 asking to
+    retry after retry_after seconds.
+    content_filter_rate of the inputs are rejected by the content filter. Which ones is decided by a
+    hash of the request's last message, so the same input is rejected every time, as by the real filter.
+    Latencies of answered chat requests are kept in .latencies.
+    """
+
+    def __init__(self, batch_seconds=0.5, latency=0.0, jitter=0.0, rate_limit_rate=0.0, retry_after=1.0,
+                 content_filter_rate=0.0, seed=0):
+        self.batch_seconds = batch_seconds
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.content_filter_rate = content_filter_rate
+        self.files = {}  # id -> (metadata, content bytes)
+        self.batches = {}  # id -> batch object
+        self.requests = 0
+        self.rate_limited = 0
+        self.filtered = 0
+        self.latencies = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def is_filtered(self, messages):
+        if not self.content_filter_rate or not messages:
+            return False
+        digest = hashlib.blake2b((messages[-1].get("content") or "").encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64 < self.content_filter_rate
+
+    def chat(self, body):
+        """Answer a chat completions request sent over HTTP. Returns (status, reply body, headers)."""
+        start = time.perf_counter()
+        with self._lock:
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter)) if self.latency or self.jitter else 0.0
+            rate_limited = self._rng.random() < self.rate_limit_rate
+        if delay:
+            time.sleep(delay)
+        if rate_limited:
+            with self._lock:
+                self.requests += 1
+                self.rate_limited += 1
+            message = (f"Requests to the ChatCompletions_Create Operation have exceeded the rate limit. "
+                       f"Please retry after {self.retry_after:g} seconds. (mock)")
+            headers = {"Retry-After": f"{self.retry_after:g}", "retry-after-ms": f"{self.retry_after * 1000:.0f}"}
+            return 429, {"error": {"code": "429", "message": message}}, headers
+        status, reply = self.complete(body)
+        with self._lock:
+            self.latencies.append(time.perf_counter() - start)
+        return status, reply, {}
+
+    def complete(self, body):
+        messages = body.get("messages") or []
+        filtered = self.is_filtered(messages)
+        with self._lock:
+            self.requests += 1
+            self.filtered += filtered
+        if filtered:
+            return 400, _content_filter_error()
+        content = fake_reply(messages)
+        prompt_tokens = sum(len(message.get("content") or "") // 4 for message in messages)
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": f"chatcmpl-{next(_ids)}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def add_file(self, filename, purpose, content):
+        file_id = f"file-{next(_ids)}"
+        metadata = {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                    "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock:
+            self.files[file_id] = (metadata, content)
+        return metadata
+
+    def create_batch(self, body):
+        if body.get("input_file_id") not in self.files:
+            return 404, {"error": {"code": "not_found", "message": f"No file {body.get('input_file_id')}"}}
+        batch = {"id": f"batch_{next(_ids)}", "object": "batch", "endpoint": body.get("endpoint"), "errors": None,
+                 "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+                 "status": "validating", "output_file_id": None, "error_file_id": None,
+                 "created_at": int(time.time()), "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self._run_batch, args=(batch,), daemon=True).start()
+        return 200, batch
+
+    def _run_batch(self, batch):
+        lines = self.files[batch["input_file_id"]][1].decode("utf-8").splitlines()
+        batch["status"] = "in_progress"
+        batch["request_counts"]["total"] = len(lines)
+        time.sleep(self.batch_seconds)
+        outputs, errors = [], []
+        for line in filter(str.strip, lines):
+            request = json.loads(line)
+            status, reply = self.complete(request.get("body") or {})
+            result = {"id": f"batch_req_{next(_ids)}", "custom_id": request.get("custom_id"),
+                      "response": {"status_code": status, "request_id": f"req-{next(_ids)}", "body": reply},
+                      "error": None}
+            (outputs if status == 200 else errors).append(json.dumps(result, ensure_ascii=False))
+        for key, results in (("output_file_id", outputs), ("error_file_id", errors)):
+            if results:
+                content = ("\n".join(results) + "\n").encode("utf-8")
+                batch[key] = self.add_file(f"{batch['id']}_{key}.jsonl", "batch_output", content)["id"]
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        batch["completed_at"] = int(time.time())
+        batch["status"] = "completed"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, body, headers=None, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        mock = self.server.mock
+        path = urlparse(self.path).path
+        body = self._body()
+        if re.fullmatch(r"/openai/deployments/[^/]+/chat/completions", path):
+            self._send(*mock.chat(json.loads(body)))
+        elif path == "/openai/files":
+            message = BytesParser(policy=HTTP).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("latin-1") + body)
+            fields = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+            if "file" not in fields:
+                self._send(400, {"error": {"code": "invalid_request", "message": "Missing file"}})
+                return
+            purpose = fields["purpose"].get_content().strip() if "purpose" in fields else "batch"
+            self._send(200, mock.add_file(fields["file"].get_filename(), purpose,
+                                          fields["file"].get_payload(decode=True)))
+        elif path == "/openai/batches":
+            self._send(*mock.create_batch(json.loads(body)))
+        else:
+            self._send(404, {"error": {"code": "not_found", "message": f"Unknown path {path}"}})
+
+    def do_GET(self):
+        mock = self.server.mock
+        path = urlparse(self.path).path
+        batch = re.fullmatch(r"/openai/batches/([^/]+)", path)
+        content = re.fullmatch(r"/openai/files/([^/]+)/content", path)
+        if batch and batch.group(1) in mock.batches:
+            self._send(200, mock.batches[batch.group(1)])
+        elif content and content.group(1) in mock.files:
+            self._send(200, mock.files[content.group(1)][1], content_type="application/octet-stream")
+        else:
+            self._send(404, {"error": {"code": "not_found", "message": f"Unknown path {path}"}})
+
+
+class MockAzureServer:
+    """
+    The stand-in service on a local HTTP server running in a background thread. port=0 picks a free
+    port; use .url as AZURE_OPENAI_ENDPOINT. Usable as a context manager.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, **kwargs):
+        self.mock = MockAzure(**kwargs)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self.mock
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-seconds", type=float, default=0.5, help="time a batch job takes to complete")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds before a chat request is answered")
+    parser.add_argument("--jitter", type=float, default=0.0, help="standard deviation of the latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of chat requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds of the 429s")
+    parser.add_argument("--content-filter-rate", type=float, default=0.0,
+                        help="share of inputs rejected by the content filter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = MockAzureServer(args.host, args.port, batch_seconds=args.batch_seconds, latency=args.latency,
+                             jitter=args.jitter, rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                             content_filter_rate=args.content_filter_rate, seed=args.seed)
+    logger.info(f"Mock Azure OpenAI listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import logging
+from utils.regex_rules import get_correction_engine
+from utils.arabizi_scorer import get_scorer, validate_arabizi_batch
+from utils.metrics import get_metrics
+from utils.variant_rules import get_variant_engine, variant_pairs, variant_seed
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """Process pool initializer: compile the correction and variant rule tables and load the scorer once per worker."""
+    get_correction_engine()
+    get_variant_engine()
+    get_scorer()
+
+
+def apply_regex_corrections(text):
+    """Apply regex corrections to text."""
+    try:
+        return get_correction_engine().apply(text).strip()
+    except Exception as e:
+        logger.error(f"Correction failed for text='{text}': {e}")
+        return text
+
+
+def generate_orthographic_variants(prompt, response, num_variants, seed=None):
+    """Generate orthographic variants of an Arabizi prompt-response pair, as (prompt, response) tuples."""
+    try:
+        return variant_pairs(prompt, response, num_variants, seed=seed)
+    except Exception as e:
+        logger.error(f"Variant generation failed for prompt='{prompt}', response='{response}': {e}")
+        return []
+
+
+def correct_translation(translation):
+    """Apply regex corrections to both sides of a translated prompt-response pair."""
+    prompt_arabizi, response_arabizi = translation
+    return apply_regex_corrections(prompt_arabizi), apply_regex_corrections(response_arabizi)
+
+
+def postprocess_entry(item, translation, num_variants, run_seed=0):
+    """
+    Correct, validate and vary one translated prompt-response pair.
+    Returns (line, invalid_variants): the serialized output record and the (prompt, response)
+    variant pairs that failed validation. Raises ValueError if neither side is valid Arabizi.
+    """
+    corrected = correct_translation(translation)
+    _, valid = validate_arabizi_batch(corrected)
+    return build_record(item, corrected, valid, num_variants, run_seed)
+
+
+def build_record(item, corrected, valid, num_variants, run_seed=0):
+    """
+    Vary a corrected translation whose sides were already validated (valid holds the prompt's and the
+    response's result) and serialize the output record; see postprocess_entry().
+    """
+    prompt_arabizi, response_arabizi = corrected
+    valid_prompt, valid_response = valid
+    if not (valid_prompt or valid_response):
+        logger.warning(f"Invalid Arabizi: prompt='{prompt_arabizi}', response='{response_arabizi}'")
+        raise ValueError("Both prompt and response are invalid Arabizi")
+
+    # Variants
+    seed = variant_seed(prompt_arabizi, response_arabizi, run_seed)
+    pairs = generate_orthographic_variants(prompt_arabizi, response_arabizi, num_variants, seed)
+
+    # Every variant of the pair is validated in one batch
+    _, valid_variants = validate_arabizi_batch([pv for pv, _ in pairs] + [rv for _, rv in pairs])
+    valid_variants = valid_variants[:len(pairs)] & valid_variants[len(pairs):]
+    variants = []
+    invalid_variants = []
+    for (pv, rv), valid_variant in zip(pairs, valid_variants):
+        if valid_variant:
+            variants.append({"prompt_variant": pv, "response_variant": rv})
+        else:
+            invalid_variants.append((pv, rv))
+
+    if not variants:
+        variants = [{"prompt_variant": prompt_arabizi, "response_variant": response_arabizi}]
+        logger.warning(f"No valid variants for prompt='{prompt_arabizi}', response='{response_arabizi}'")
+
+    record = {
+        "original": {
+            "prompt_en": item.get("prompt"),
+            "response_en": item.get("response"),
+            "prompt_arabizi": prompt_arabizi,
+            "response_arabizi": response_arabizi
+        },
+        "variants": variants
+    }
+    return json.dumps(record, ensure_ascii=False), invalid_variants
+
+
+def postprocess_chunk(entries, num_variants, run_seed=0):
+    """
+    Run postprocess_entry over a list of (item, translation) pairs; the unit of work sent to a
+    process pool. The corrected translations of the whole chunk are scored in one batch, so invalid
+    ones are rejected before any variant is generated for them.
+    Returns one (line, invalid_variants, error) tuple per entry, in order.
+    """
+    metrics = get_metrics()
+    with metrics.timer("postprocess.correct", records=len(entries)):
+        corrected = [correct_translation(translation) for _, translation in entries]
+    with metrics.timer("postprocess.validate", records=len(entries)):
+        _, valid = validate_arabizi_batch([text for pair in corrected for text in pair])
+    results = []
+    with metrics.timer("postprocess.variants", records=len(entries)):
+        for index, (item, _) in enumerate(entries):
+            try:
+                line, invalid_variants = build_record(item, corrected[index], valid[2 * index:2 * index + 2],
+                                                      num_variants, run_seed)
+                results.append((line, invalid_variants, None))
+            except (ValueError, KeyError) as e:
+                results.append((None, [], e))
+            except Exception as e:
+                # Arbitrary exceptions may not pickle back to the parent process
+                results.append((None, [], RuntimeError(f"{type(e).__name__}: {e}")))
+    return results
+
+
+def postprocess_chunk_in_worker(entries, num_variants, run_seed=0):
+    """postprocess_chunk() in a worker process; also returns the metrics it recorded, for the parent to merge."""
+    return postprocess_chunk(entries, num_variants, run_seed), get_metrics().drain()
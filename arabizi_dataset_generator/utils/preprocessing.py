@@ -0,0 +1,156 @@
+import logging
+import re
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CLEAN_PATTERN = r"[^\w\s.,!?']"  # Characters removed from every turn
+TURN_DELIMITER = r"[.!?]+\s+"  # Sentence punctuation that ends a turn in stringified dialogs
+# Marks turn boundaries inside a whole dialog string; it is whitespace, so cleaning keeps it
+TURN_SEPARATOR = "\x1e"
+CSV_CHUNK_ROWS = 1000  # Dialog rows parsed and preprocessed at a time when streaming a CSV
+
+# For ASCII text the cleaning regex reduces to deleting a fixed set of characters
+_ASCII_DELETIONS = str.maketrans("", "", "".join(c for c in map(chr, range(128)) if re.match(CLEAN_PATTERN, c)))
+
+
+def clean_column(texts):
+    """
+    Remove CLEAN_PATTERN characters from every string in the Series.
+    ASCII strings take the much cheaper str.translate path; the rest go through the regex.
+    """
+    texts = texts.astype(object)  # Python re semantics for \w and \s, not pyarrow's RE2
+    is_ascii = texts.map(str.isascii).astype(bool)
+    if is_ascii.all():
+        return texts.str.translate(_ASCII_DELETIONS)
+    cleaned = pd.concat([
+        texts[is_ascii].str.translate(_ASCII_DELETIONS),
+        texts[~is_ascii].str.replace(CLEAN_PATTERN, "", regex=True)
+    ])
+    return cleaned.sort_index(kind="stable")
+
+
+def explode_turns(dialogs):
+    """
+    Split a Series of dialogs into cleaned, non-empty turns with column-wide string ops.
+    String dialogs are split on sentence punctuation; list dialogs are taken turn by turn.
+    Each dialog is cleaned as one string with its turn boundaries marked by TURN_SEPARATOR,
+    then exploded into turns. Returns a Series of turns indexed by the dialog's position.
+    Works on object dtype: with pandas' pyarrow-backed strings, regexes run on RE2, where \s does
+    not match TURN_SEPARATOR and \w is ASCII-only.
+    """
+    dialogs = dialogs.reset_index(drop=True).astype(object)
+    is_string = dialogs.map(lambda value: isinstance(value, str)).astype(bool)
+    is_list = dialogs.map(lambda value: isinstance(value, list)).astype(bool)
+
+    joined = dialogs[is_string]
+    if joined.str.contains(TURN_SEPARATOR, regex=False).any():
+        joined = joined.str.replace(TURN_SEPARATOR, " ", regex=False)
+    joined = joined.str.replace(TURN_DELIMITER, TURN_SEPARATOR, regex=True)
+    if is_list.any():
+        lists = dialogs[is_list].map(
+            lambda turns: TURN_SEPARATOR.join(str(turn).replace(TURN_SEPARATOR, " ") for turn in turns))
+        joined = pd.concat([joined, lists]).sort_index(kind="stable")
+
+    turns = clean_column(joined).str.split(TURN_SEPARATOR, regex=False).explode().str.strip()
+    return turns[turns.notna() & (turns != "")]
+
+
+def pair_turns_frame(turns, stride=1):
+    """
+    Pair turns of the same dialog into a prompt-response DataFrame.
+    stride=1 pairs every consecutive turn (i, i+1); stride=2 pairs (0, 1), (2, 3), ...
+    """
+    grouped = turns.groupby(level=0, sort=False)
+    responses = grouped.shift(-1)
+    positions = grouped.cumcount()
+    mask = responses.notna() & (positions % stride == 0)
+    return pd.DataFrame({
+        "prompt": turns[mask].to_numpy(dtype=object),
+        "response": responses[mask].to_numpy(dtype=object)
+    })
+
+
+def preprocess_dialogs(df, stride=1):
+    """Vectorized preprocessing of a DailyDialog DataFrame into prompt-response pairs."""
+    if "dialog" not in df.columns:
+        logger.error("Missing 'dialog' column in dataset")
+        return pd.DataFrame({"prompt": [], "response": []})
+    return pair_turns_frame(explode_turns(df["dialog"]), stride=stride)
+
+
+def dialog_turn_lists(df):
+    """Vectorized split of every dialog in the DataFrame into its list of cleaned turns."""
+    if "dialog" not in df.columns:
+        logger.error("Missing 'dialog' column in dataset")
+        return []
+    turns = explode_turns(df["dialog"])
+    return turns.groupby(level=0, sort=False).agg(list).tolist()
+
+
+def read_dialog_chunks(path, chunksize=CSV_CHUNK_ROWS):
+    """
+    Yield DataFrames of up to chunksize rows of a DailyDialog CSV, parsing only its 'dialog' column.
+    The file is memory-mapped and read lazily, so a consumer that stops early never parses the rest.
+    """
+    with pd.read_csv(path, chunksize=chunksize, usecols=lambda column: column == "dialog",
+                     memory_map=True) as reader:
+        for chunk in reader:
+            if "dialog" not in chunk.columns:
+                logger.error(f"Missing 'dialog' column in {path}")
+                return
+            yield chunk
+
+
+def iter_pairs(path, offset=0, limit=None, stride=1, chunksize=CSV_CHUNK_ROWS):
+    """
+    Stream prompt-response pairs (dicts) from a DailyDialog CSV, preprocessing chunksize rows at a time.
+    Yields pairs offset .. offset + limit - 1 (all remaining pairs if limit is None) and stops reading
+    the file as soon as the window is complete.
+    """
+    remaining = limit
+    position = 0
+    if remaining is not None and remaining <= 0:
+        return
+    for chunk in read_dialog_chunks(path, chunksize):
+        pairs = preprocess_dialogs(chunk, stride=stride)
+        start = max(0, offset - position)
+        position += len(pairs)
+        if start >= len(pairs):
+            continue
+        stop = len(pairs) if remaining is None else min(len(pairs), start + remaining)
+        for prompt, response in zip(pairs["prompt"].iloc[start:stop], pairs["response"].iloc[start:stop]):
+            yield {"prompt": prompt, "response": response}
+        if remaining is not None:
+            remaining -= stop - start
+            if remaining <= 0:
+                return
+
+
+def iter_dialog_turns(path, offset=0, limit=None, chunksize=CSV_CHUNK_ROWS):
+    """
+    Stream the cleaned turn lists of a DailyDialog CSV's dialogs, windowed like iter_pairs(stride=1):
+    only the turns behind consecutive pairs offset .. offset + limit - 1 are kept, so the first dialog
+    may start mid-way and the last one is cut after the limit-th pair.
+    """
+    skip = offset
+    remaining = limit
+    if remaining is not None and remaining <= 0:
+        return
+    for chunk in read_dialog_chunks(path, chunksize):
+        for turns in dialog_turn_lists(chunk):
+            num_pairs = len(turns) - 1  # Turns are non-empty, so every consecutive pair counts
+            if num_pairs <= 0:
+                continue
+            if skip >= num_pairs:
+                skip -= num_pairs
+                continue
+            turns = turns[skip:]
+            skip = 0
+            if remaining is not None and len(turns) - 1 > remaining:
+                turns = turns[:remaining + 1]
+            yield turns
+            if remaining is not None:
+                remaining -= len(turns) - 1
+                if remaining <= 0:
+                    return
@@ -0,0 +1,113 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """
+    Estimate the quota cost of a chat request: roughly 4 characters per prompt token,
+    a few tokens of overhead per message, plus the completion budget (max_tokens).
+    """
+    prompt_tokens = sum(len(message.get("content") or "") // 4 + 4 for message in messages)
+    return prompt_tokens + 3 + max_tokens
+
+
+def get_retry_after(error, default=None):
+    """
+    Read the Retry-After delay (in seconds) from an API error's response headers.
+    Prefers the millisecond header Azure sends, falls back to the standard one.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) / scale)
+        except (TypeError, ValueError):
+            continue
+    return default
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute.
+    It holds at most `burst_seconds` worth of refill, matching how Azure evaluates quota
+    over short windows rather than whole minutes.
+    """
+
+    def __init__(self, per_minute, burst_seconds=10):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale=1.0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, amount, scale=1.0):
+        """Seconds until `amount` units are available (0 if they already are)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / (self.rate * scale)
+
+
+class RateLimiter:
+    """
+    Shared limiter for requests-per-minute and tokens-per-minute quotas.
+    Callers reserve the estimated cost with acquire() before each request, report the real
+    usage with settle(), and call on_success() / on_rate_limited() with the outcome.
+    The refill rate backs off multiplicatively on 429s and ramps up again on successes.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, burst_seconds=10, min_scale=0.1,
+                 ramp_step=0.05, default_retry_after=10.0):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+        self.min_scale = min_scale
+        self.ramp_step = ramp_step
+        self.default_retry_after = default_retry_after
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Block until one request and `tokens` tokens fit in the budget, then reserve them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.requests.refill(now, self.scale)
+                self.tokens.refill(now, self.scale)
+                wait = max(self.paused_until - now,
+                           self.requests.wait_time(1, self.scale),
+                           self.tokens.wait_time(tokens, self.scale))
+                if wait <= 0:
+                    self.requests.tokens -= 1
+                    self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                    return
+            time.sleep(wait)
+
+    def settle(self, reserved, used):
+        """Give back (or charge) the difference between the reserved estimate and real usage."""
+        if used is None:
+            return
+        with self._lock:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + reserved - used)
+
+    def on_success(self):
+        with self._lock:
+            self.scale = min(1.0, self.scale + self.ramp_step)
+
+    def on_rate_limited(self, retry_after=None):
+        """Pause every caller for the server's Retry-After delay and halve the refill rate."""
+        delay = self.default_retry_after if retry_after is None else retry_after
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.scale = max(self.min_scale, self.scale / 2)
+            scale = self.scale
+        logger.info(f"Rate limit hit, pausing requests for {delay:.1f}s (rate scaled to {scale:.0%})")
@@ -1,13 +1,20 @@
 import re
 import json
 import os
+import threading
 import logging
+from pathlib import Path
+from utils.metrics import get_metrics
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def load_corrections(file_path="D:/code-X_internship/arabizi_dataset_generator/data/config/corrections.json"):
+DEFAULT_CORRECTIONS_PATH = Path(__file__).resolve().parent.parent / "configs" / "corrections.json"
+
+# Rules that only ever match one whole \w+ token, e.g. r"\bkeef\b" or r"\b(?<!\d)5(?![\d\w])\b"
+# (the lookarounds there are already implied by the word boundaries)
+_WORD_RULE = re.compile(r"^\\b(?:\(\?<!\\d\))?(\w+)(?:\(\?!\[\\d\\w\]\))?\\b$")
+
+def load_corrections(file_path=DEFAULT_CORRECTIONS_PATH):
     """
     Load regex correction rules from a JSON file.
     Returns a dictionary of {pattern: replacement}.
@@ -48,12 +55,78 @@ def apply_corrections(text, corrections_dict):
         logger.debug(f"Applied corrections: '{original_text}' -> '{text}'")
     return text
 
-def validate_arabizi(text):
+class CorrectionEngine:
     """
-    Basic validation for Arabizi text.
-    Returns True if text contains Arabizi-specific characters, False otherwise.
+    Precompiled form of a corrections dictionary with the same results as apply_corrections.
+    Each run of consecutive whole-word rules becomes a single alternation regex over all their
+    words; a matched token is rewritten by replaying that run on the token alone (memoized).
+    Any other rule runs as its own compiled regex, in its original position.
     """
-    if not text:
-        return False
-    pattern = r'[37shkhgh2]'
-    return bool(re.search(pattern, text, re.IGNORECASE))
\ No newline at end of file
+
+    def __init__(self, corrections_dict):
+        self.steps = []
+        word_run = []
+        for pattern, repl in corrections_dict.items():
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.error(f"Invalid regex pattern '{pattern}': {e}")
+                continue
+            match = _WORD_RULE.match(pattern)
+            if match and "\\" not in repl:
+                word_run.append((match.group(1), compiled, repl))
+                continue
+            self._add_word_step(word_run)
+            word_run = []
+            self.steps.append((compiled, repl))
+        self._add_word_step(word_run)
+
+    def _add_word_step(self, word_run):
+        if not word_run:
+            return
+        words = sorted({word for word, _, _ in word_run}, key=len, reverse=True)
+        combined = re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + r")\b", re.IGNORECASE)
+        rules = [(compiled, repl) for _, compiled, repl in word_run]
+        memo = {}
+
+        def rewrite(match):
+            token = match.group(0)
+            result = memo.get(token)
+            if result is None:
+                result = token
+                for compiled, repl in rules:
+                    result = compiled.sub(repl, result)
+                memo[token] = result
+            return result
+
+        self.steps.append((combined, rewrite))
+
+    @classmethod
+    def from_file(cls, file_path=DEFAULT_CORRECTIONS_PATH):
+        return cls(load_corrections(file_path))
+
+    def apply(self, text):
+        """Apply all corrections to text. Returns corrected text."""
+        if not text:
+            return text
+        original_text = text
+        for compiled, repl in self.steps:
+            text = compiled.sub(repl, text)
+        if text != original_text:
+            logger.debug(f"Applied corrections: '{original_text}' -> '{text}'")
+        return text
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_correction_engine(file_path=DEFAULT_CORRECTIONS_PATH):
+    """Return the process-wide CorrectionEngine, loading and compiling the rules on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                with get_metrics().timer("regex.compile"):
+                    _engine = CorrectionEngine.from_file(file_path)
+    return _engine
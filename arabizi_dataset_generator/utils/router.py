@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+import logging
+
+from utils.rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 3  # Consecutive server errors that trip an endpoint's circuit breaker
+COOLDOWN_SECONDS = 30.0  # How long a tripped breaker stays open before a trial request is let through
+
+
+class Endpoint:
+    """
+    One Azure OpenAI deployment: its client, its own RPM/TPM rate limiter and a circuit breaker.
+    `model` is the deployment name callers ask for (the name in their cache keys); `deployment` is
+    the name of the deployment on this resource. An endpoint with model=None serves any requested
+    name, under that name, like a single hard-wired deployment does.
+    The client is created by client_factory() on first use.
+    """
+
+    def __init__(self, name, client_factory, requests_per_minute, tokens_per_minute, weight=1.0, model=None,
+                 deployment=None):
+        if weight <= 0:
+            raise ValueError(f"Endpoint {name}: weight must be positive")
+        self.name = name
+        self.weight = float(weight)
+        self.model = model
+        self.deployment = deployment or model
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._client_factory = client_factory
+        self._client = None
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.0  # 0 while the breaker is closed; open until, then half-open after, this time
+        self.trial = False  # The half-open trial request is in flight
+        self.requests = 0
+        self.errors = 0
+        self.trips = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def accepts(self, now):
+        """Closed breakers accept requests; a half-open one accepts a single trial request."""
+        return not self.open_until or (self.open_until <= now and not self.trial)
+
+    def serves(self, model):
+        return self.model is None or self.model == model
+
+    def deployment_for(self, model):
+        """Name of the deployment to send a request for `model` to."""
+        return self.deployment or model
+
+
+class EndpointPool:
+    """
+    Routes requests across endpoints by weighted least outstanding requests: each request goes to the
+    endpoint with the fewest requests in flight (waiting on its rate limiter included) per unit of
+    weight, so faster or larger deployments take proportionally more traffic.
+    Every endpoint has a circuit breaker. A 429 opens it for the Retry-After delay; failure_threshold
+    consecutive server errors open it for cooldown seconds. While open the endpoint gets no requests;
+    afterwards one trial request is let through, and its outcome closes or re-opens the breaker.
+    Safe to share between threads.
+    """
+
+    def __init__(self, endpoints, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN_SECONDS):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._turn = 0  # Rotates the order in which tied endpoints are considered
+        self._lock = threading.Lock()
+
+    def _candidates(self, model, exclude=()):
+        return [endpoint for endpoint in self.endpoints if endpoint.serves(model) and endpoint not in exclude]
+
+    def acquire(self, model, exclude=()):
+        """
+        Pick the endpoint for a request for `model`, blocking while every breaker is open, and count
+        the request as outstanding. Endpoints in exclude (e.g. ones that failed this request) are
+        only used if no other endpoint serves the model. Returns (endpoint, trial), trial being True
+        if this is the half-open endpoint's trial request; pass both to release() when it is done.
+        """
+        candidates = self._candidates(model, exclude) or self._candidates(model)
+        if not candidates:
+            raise ValueError(f"No endpoint serves deployment {model}")
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                available = [endpoint for endpoint in candidates if endpoint.accepts(now)]
+                if available:
+                    self._turn = (self._turn + 1) % len(self.endpoints)
+                    order = {endpoint: (index - self._turn) % len(self.endpoints)
+                             for index, endpoint in enumerate(self.endpoints)}
+                    endpoint = min(available, key=lambda e: ((e.outstanding + 1) / e.weight, order[e]))
+                    trial = bool(endpoint.open_until)
+                    if trial:
+                        endpoint.trial = True  # Half-open: the outcome of this request closes or re-opens it
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint, trial
+                # Wait for the first breaker to half-open, or for a trial request to finish
+                wait = min((endpoint.open_until - now for endpoint in candidates if endpoint.open_until > now),
+                           default=0.05)
+            time.sleep(max(wait, 0.05))
+
+    def release(self, endpoint, trial, success=True, rate_limited=False, retry_after=None):
+        """
+        Report the outcome of a request sent to endpoint, with the trial flag acquire() returned for
+        it. Pass success=False for server errors and timeouts, rate_limited=True for a 429. Outcomes
+        that say nothing about the endpoint's health, such as a content filter rejection, count as
+        success. Only the trial request closes an open breaker or lets the next trial through;
+        successes of requests sent before the breaker opened leave it open.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if trial:
+                endpoint.trial = False
+            if rate_limited:
+                endpoint.errors += 1
+                self._trip(endpoint, self.cooldown if retry_after is None else retry_after)
+            elif not success:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold or endpoint.open_until:
+                    self._trip(endpoint, self.cooldown)
+            else:
+                endpoint.failures = 0
+                if trial or not endpoint.open_until:
+                    endpoint.open_until = 0.0  # A success from before the breaker opened does not close it
+
+    def _trip(self, endpoint, delay):
+        endpoint.open_until = max(endpoint.open_until, time.monotonic() + max(delay, 0.001))
+        endpoint.trips += 1
+        logger.warning(f"Circuit breaker open for endpoint {endpoint.name} for {delay:.1f}s")
+
+    def has_alternative(self, endpoint, model):
+        """Return True if another endpoint serving model is accepting requests right now."""
+        now = time.monotonic()
+        with self._lock:
+            return any(other.accepts(now) for other in self._candidates(model, (endpoint,)))
+
+    def stats(self):
+        return {endpoint.name: {"requests": endpoint.requests, "errors": endpoint.errors, "trips": endpoint.trips}
+                for endpoint in self.endpoints}
+
+    def log_summary(self):
+        if len(self.endpoints) < 2 and not self.endpoints[0].trips:
+            return
+        for endpoint in self.endpoints:
+            logger.info(f"Endpoint {endpoint.name}: {endpoint.requests} requests, {endpoint.errors} errors, "
+                        f"breaker tripped {endpoint.trips} times")
+
+
+def load_endpoints(path, client_factory, default_rpm, default_tpm):
+    """
+    Build endpoints from a JSON list like configs/endpoints.example.json. Every entry names an
+    Azure resource ("endpoint", or "endpoint_env", the environment variable holding it), the
+    environment variable holding its key ("api_key_env"), and the "deployment" on it; optional
+    fields are "name", "model" (the deployment name callers ask for, default the deployment),
+    "weight", "rpm", "tpm" and "api_version". client_factory(azure_endpoint, api_key, api_version)
+    creates the client; api_version None means the caller's default.
+    Keys are read from the environment so the file can be committed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    endpoints = []
+    for index, entry in enumerate(entries):
+        name = entry.get("name") or f"endpoint{index}"
+        azure_endpoint = entry.get("endpoint") or os.getenv(entry.get("endpoint_env", ""))
+        api_key = os.getenv(entry.get("api_key_env", ""))
+        if not azure_endpoint or not api_key or not entry.get("deployment"):
+            raise ValueError(f"Endpoint {name} in {path} needs an endpoint, a set api_key_env and a deployment")
+
+        def factory(azure_endpoint=azure_endpoint, api_key=api_key, api_version=entry.get("api_version")):
+            return client_factory(azure_endpoint, api_key, api_version)
+        endpoints.append(Endpoint(name, factory, int(entry.get("rpm", default_rpm)), int(entry.get("tpm", default_tpm)),
+                                  weight=entry.get("weight", 1.0), model=entry.get("model", entry["deployment"]),
+                                  deployment=entry["deployment"]))
+    logger.info(f"Loaded {len(endpoints)} endpoints from {path}")
+    return endpoints
@@ -0,0 +1,290 @@
+"""
+Sharded generation across machines. Every translation unit of the input (a dialog, or a pair outside
+dialog mode) belongs to one of num_shards shards, picked by a jump consistent hash of its dedup_key():
+the assignment does not depend on input order or on which machine reads it, duplicates (the same text
+up to case, punctuation and spacing) land in the same shard, so deduplication still catches them, and
+changing num_shards only moves the units that have to move (about 1/num_shards of them when adding a
+shard). A shard run writes its own output, checkpoint
+and skipped-entries files next to the unsharded ones, "<stem>.shard-00003<suffix>", plus a manifest,
+"<shard output>.shard.json", once it has gone through its whole share of the input.
+
+merge_shards() checks that every shard's manifest is there, complete, from the same input and settings,
+and matches its output file, then interleaves the shard outputs back into input order (dropping records
+a shard kept from before a re-shard that another shard also has) and concatenates their skipped-entries
+files.
+
+On a shared filesystem, nodes can instead pick shards up as they go idle: a shard is claimed by creating
+"<shard output>.claim" with O_EXCL, which only one node can do. The claiming node touches the file while
+it works, so the claim of a node that died goes stale after CLAIM_TIMEOUT seconds and can be taken over.
+Give every node its own ARABIZI_CACHE_PATH and ARABIZI_SKIPPED_PATH.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from utils.checkpoint import iter_checkpointed_spans
+from utils.dedup import dedup_key
+from utils.manifest import file_digest, record_digest
+
+logger = logging.getLogger(__name__)
+
+SHARD_MANIFEST_VERSION = 1
+# Seconds without a heartbeat after which a claim is considered abandoned
+CLAIM_TIMEOUT = float(os.getenv("ARABIZI_CLAIM_TIMEOUT", "900"))
+
+
+class ShardMergeError(Exception):
+    """Raised when the shards of a run cannot be merged: missing, incomplete or inconsistent."""
+
+
+def jump_hash(key, num_buckets):
+    """Jump consistent hash (Lamping and Veach) of a 64-bit integer key into range(num_buckets)."""
+    bucket, candidate = -1, 0
+    while candidate < num_buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(texts, num_shards):
+    """
+    Shard of a translation unit, from its texts (a dialog's turns, or a pair's prompt and response).
+    Hashes the Deduplicator's key, so units it would group together always share a shard.
+    """
+    key = dedup_key([text if isinstance(text, str) else "" for text in texts])
+    return jump_hash(int.from_bytes(key[:8], "big"), num_shards)
+
+
+def shard_path(path, index):
+    """Path of shard index's copy of an output file: "<stem>.shard-00003<suffix>" in the same directory."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.shard-{index:05d}{path.suffix}")
+
+
+def manifest_path(output_path):
+    return Path(f"{output_path}.shard.json")
+
+
+def write_shard_manifest(output_path, index, num_shards, input_path, params, complete, counts=None):
+    """
+    Record a finished shard run. complete is False when entries are left for a resumed run to retry.
+    params holds the settings that decide a run's output; merge_shards() only merges matching shards.
+    """
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "shard_index": index,
+        "num_shards": num_shards,
+        "input": file_digest(input_path),
+        "params": record_digest(params),
+        "output": file_digest(output_path),
+        "complete": complete,
+        "counts": counts or {},
+        "host": socket.gethostname(),
+        "finished": datetime.now(timezone.utc).isoformat(),
+    }
+    path = manifest_path(output_path)
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_shard_manifest(output_path):
+    """Return the manifest of a shard output, or None if there is none (yet)."""
+    try:
+        with open(manifest_path(output_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get("version") == SHARD_MANIFEST_VERSION else None
+
+
+def run_digests(input_path, params):
+    """Digests of a run's input file and settings, as recorded in its shard manifests."""
+    return file_digest(input_path), record_digest(params)
+
+
+def is_shard_complete(output_path, num_shards, digests):
+    """
+    Whether the shard at output_path went through its whole share of the input as one of num_shards
+    shards, on the input and settings of digests (from run_digests()). A shard left from another
+    input or other settings is stale: it is not complete and has to run again.
+    """
+    manifest = load_shard_manifest(output_path)
+    return bool(manifest and manifest["complete"] and manifest["num_shards"] == num_shards
+                and (manifest["input"], manifest["params"]) == tuple(digests))
+
+
+def check_shards(output_path, num_shards, input_path, params):
+    """
+    Return the problems that keep the shards of output_path from being merged: a shard whose manifest
+    is missing or incomplete, from another input, settings or shard count, or whose output has changed since.
+    """
+    problems = []
+    input_digest, params_digest = run_digests(input_path, params)
+    for index in range(num_shards):
+        path = shard_path(output_path, index)
+        manifest = load_shard_manifest(path)
+        if manifest is None:
+            problems.append(f"shard {index}: no manifest (not run or not finished)")
+        elif not manifest["complete"]:
+            problems.append(f"shard {index}: incomplete, {manifest['counts'].get('retry', 0)} entries to retry")
+        elif manifest["num_shards"] != num_shards:
+            problems.append(f"shard {index}: run as one of {manifest['num_shards']} shards")
+        elif manifest["input"] != input_digest or manifest["params"] != params_digest:
+            problems.append(f"shard {index}: run on another input or with other settings")
+        elif manifest["output"] != file_digest(path):
+            problems.append(f"shard {index}: output changed since its manifest was written")
+    return problems
+
+
+def merge_shards(output_path, skipped_path, num_shards, input_path, params):
+    """
+    Merge the outputs of every shard into output_path, in input order (by the input index in each
+    record's checkpoint key), and concatenate their skipped entries into skipped_path. A key found in
+    several shards (left over from a run with another shard count) is written once. Raises
+    ShardMergeError, leaving output_path alone, if check_shards() finds problems.
+    Returns the counts of the merge, which are also saved next to output_path as "<output>.shards.json".
+    """
+    problems = check_shards(output_path, num_shards, input_path, params)
+    if problems:
+        raise ShardMergeError(f"Cannot merge {num_shards} shards of {output_path}: " + "; ".join(problems))
+
+    output_path, skipped_path = Path(output_path), Path(skipped_path)
+    # Keys are "<input index>:<digest>"; only the byte ranges of the records are held, not the records
+    spans = sorted((int(key.split(":", 1)[0]), index, key, start, end)
+                   for index in range(num_shards)
+                   for key, start, end in iter_checkpointed_spans(shard_path(output_path, index)))
+    seen = set()
+    counts = {"num_shards": num_shards, "records": 0, "duplicates": 0, "skipped": 0, "shards": [0] * num_shards}
+    tmp_path = Path(f"{output_path}.tmp")
+    shards = [open(shard_path(output_path, index), "rb") for index in range(num_shards)]
+    try:
+        with open(tmp_path, "wb") as output:
+            for _, index, key, start, end in spans:
+                if key in seen:
+                    counts["duplicates"] += 1
+                    continue
+                seen.add(key)
+                shards[index].seek(start)
+                record = shards[index].read(end - start)
+                output.write(record if record.endswith(b"\n") else record + b"\n")
+                counts["records"] += 1
+                counts["shards"][index] += 1
+    finally:
+        for shard in shards:
+            shard.close()
+    os.replace(tmp_path, output_path)
+
+    tmp_path = Path(f"{skipped_path}.tmp")
+    with open(tmp_path, "wb") as skipped:
+        for index in range(num_shards):
+            path = shard_path(skipped_path, index)
+            if path.exists():
+                with open(path, "rb") as f:
+                    for line in f:
+                        skipped.write(line)
+                        counts["skipped"] += 1
+    os.replace(tmp_path, skipped_path)
+
+    with open(f"{output_path}.shards.json", "w", encoding="utf-8") as f:
+        json.dump(counts, f, indent=2)
+    logger.info(f"Merged {num_shards} shards into {output_path}: {counts['records']} records "
+                f"({counts['duplicates']} duplicates dropped), {counts['skipped']} skipped entries")
+    return counts
+
+
+def claim_path(output_path):
+    return Path(f"{output_path}.claim")
+
+
+class Claim:
+    """
+    Exclusive claim on a shard (or on the merge) through a claim file on a shared filesystem.
+    acquire() creates the file with O_EXCL, taking over a claim whose heartbeat stopped CLAIM_TIMEOUT
+    seconds ago; while held, a thread touches the file every timeout / 4 seconds. Use as:
+        claim = Claim(claim_path(path))
+        if claim.acquire():
+            with claim:
+                ...
+    """
+
+    def __init__(self, path, timeout=CLAIM_TIMEOUT):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _is_stale(self, path):
+        try:
+            return time.time() - os.stat(path).st_mtime > self.timeout
+        except FileNotFoundError:
+            return False
+
+    def _take_over_stale(self):
+        """Move a stale claim out of the way. Returns False if it turned out to be live."""
+        moved = self.path.with_name(f"{self.path.name}.stale-{self.token}")
+        try:
+            os.rename(self.path, moved)
+        except FileNotFoundError:
+            return True  # Released or taken over by another node meanwhile
+        if not self._is_stale(moved):
+            # Another node claimed it between the check and the rename: give it back
+            try:
+                os.link(moved, self.path)
+            except OSError:
+                pass
+            os.remove(moved)
+            return False
+        logger.warning(f"Taking over stale claim {self.path}")
+        os.remove(moved)
+        return True
+
+    def acquire(self):
+        """Try to claim. Returns True if this process now holds the claim, False if another node does."""
+        if self._is_stale(self.path) and not self._take_over_stale():
+            return False
+        os.makedirs(self.path.parent, exist_ok=True)
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"token": self.token, "host": socket.gethostname(), "pid": os.getpid(),
+                       "claimed": datetime.now(timezone.utc).isoformat()}, f)
+        self._heartbeat = threading.Thread(target=self._beat, daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _beat(self):
+        while not self._stop.wait(self.timeout / 4):
+            try:
+                os.utime(self.path)
+            except OSError as e:
+                logger.warning(f"Failed to refresh claim {self.path}: {e}")
+
+    def release(self):
+        """Stop the heartbeat and remove the claim file, unless another node has taken it over."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                owner = json.load(f).get("token")
+        except (OSError, json.JSONDecodeError):
+            return
+        if owner == self.token:
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
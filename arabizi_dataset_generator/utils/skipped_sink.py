@@ -0,0 +1,102 @@
+import atexit
+import json
+import os
+import threading
+import logging
+from collections import Counter
+from pathlib import Path
+from utils.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SKIPPED_PATH = Path(__file__).resolve().parent.parent / "data" / "corrected" / "skipped_entries.jsonl"
+
+# Error codes stored with every skipped record
+ERROR_VALIDATION = "validation"
+ERROR_INVALID_ARABIZI = "invalid_arabizi"
+ERROR_INVALID_VARIANT = "invalid_variant"
+ERROR_MISSING_KEY = "missing_key"
+ERROR_CONTENT_FILTER = "content_filter"
+ERROR_UNEXPECTED = "unexpected"
+
+
+class SkippedSink:
+    """
+    Append-only JSONL sink for skipped entries that keeps one file handle open for the whole run.
+    Records are buffered and flushed every `flush_every` writes and on close().
+    Counts records per error code for the end-of-run summary. Safe to share between threads.
+    """
+
+    def __init__(self, path, flush_every=100):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self.counts = Counter()
+        self._file = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def write(self, record, code, error=None):
+        """Append record with its error code and message (defaults to the code)."""
+        line = json.dumps({**record, "error": str(error) if error is not None else code, "code": code},
+                          ensure_ascii=False)
+        get_metrics().incr(f"skipped.{code}")
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.path.parent, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self.counts[code] += 1
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._pending = 0
+
+    def log_summary(self):
+        total = sum(self.counts.values())
+        if not total:
+            return
+        details = ", ".join(f"{code}: {count}" for code, count in self.counts.most_common())
+        logger.info(f"Skipped {total} records to {self.path} ({details})")
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(path=DEFAULT_SKIPPED_PATH):
+    """Return the process-wide sink for path, so every writer shares one handle per file."""
+    key = os.path.abspath(path)
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None:
+            sink = _sinks[key] = SkippedSink(path)
+        return sink
+
+
+def log_summaries():
+    """Log the summary of every sink used in this process."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.log_summary()
+
+
+@atexit.register
+def close_sinks():
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
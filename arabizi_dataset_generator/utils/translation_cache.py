@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / "data" / "cache" / "translations.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_FILTER_TTL = 30 * 24 * 3600  # Seconds a content-filtered input is remembered
+
+
+def normalize_text(text):
+    """Normalize text for cache keys: Unicode NFC and collapsed whitespace."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def make_key(texts, system_prompt, deployment_name, temperature):
+    """
+    Build a content-addressed cache key from the normalized input texts, the system prompt,
+    the deployment name and the sampling temperature.
+    """
+    payload = json.dumps([[normalize_text(t) for t in texts], system_prompt, deployment_name, temperature],
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def filter_key(texts, deployment_name):
+    """
+    Build the negative cache key of a request from its normalized input texts and the deployment.
+    The content filter judges the input, so the key ignores the system prompt and sampling settings.
+    """
+    payload = json.dumps([[normalize_text(t) for t in texts], deployment_name], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    On-disk SQLite cache of GPT translations keyed by make_key().
+    Least recently used rows are evicted once the stored text exceeds max_bytes.
+    A second table is a negative cache of inputs rejected by the content filter, keyed by filter_key();
+    its rows expire after filter_ttl seconds, so a changed filter policy is picked up eventually.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, filter_ttl=DEFAULT_FILTER_TTL):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.filter_ttl = filter_ttl
+        self.hits = 0
+        self.misses = 0
+        self.filtered_hits = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path.parent, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_accessed ON translations (accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS filtered (key TEXT PRIMARY KEY, expires REAL NOT NULL)")
+        self._conn.execute("DELETE FROM filtered WHERE expires <= ?", (time.time(),))
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached value (a list of strings) for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE translations SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        """Store value (a list of strings) under key, evicting old rows if over the size limit."""
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(key) + len(data.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time())
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def is_filtered(self, key):
+        """Return True if the input with this filter_key() was rejected by the content filter and has not expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT expires FROM filtered WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            if row[0] <= time.time():
+                self._conn.execute("DELETE FROM filtered WHERE key = ?", (key,))
+                return False
+            self.filtered_hits += 1
+        return True
+
+    def mark_filtered(self, key):
+        """Remember for filter_ttl seconds that the content filter rejected the input with this filter_key()."""
+        if self.filter_ttl <= 0:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO filtered (key, expires) VALUES (?, ?)",
+                               (key, time.time() + self.filter_ttl))
+
+    def _evict(self):
+        """Drop least recently used rows until the cache is back under 90% of max_bytes."""
+        target = self.max_bytes * 0.9
+        evicted = 0
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM translations ORDER BY accessed LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._size -= size
+                evicted += 1
+        logger.info(f"Evicted {evicted} translations from cache {self.path}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_bytes": self._size,
+            "filtered_hits": self.filtered_hits,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,15 +1,26 @@
+import hashlib
+import math
 import random
 import json
 import os
 import re
+import sys
+import threading
 import logging
+from pathlib import Path
+from utils.metrics import get_metrics
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_VARIANTS_PATH = Path(__file__).resolve().parent.parent / "configs" / "variants.json"
+# "unique": distinct variants, closest to the text first (VariantEngine.generate_unique);
+# "random": an independent random alternative per match site, duplicates included (VariantEngine.generate)
+VARIANT_MODE = os.getenv("ARABIZI_VARIANT_MODE", "unique")
+VARIANT_MODES = ("unique", "random")
+OVERSAMPLE = 4  # Candidates drawn per requested variant in "unique" mode, to rank by edit distance
 
-def load_variant_map(file_path="D:/code-X_internship/arabizi_dataset_generator/data/config/variants.json"):
+
+def load_variant_map(file_path=DEFAULT_VARIANTS_PATH):
     """
     Load variant mapping from a JSON file.
     Returns a dictionary of {pattern: [alternatives]}.
@@ -34,46 +45,182 @@ def load_variant_map(file_path="D:/code-X_internship/arabizi_dataset_generator/d
     return default_map
 
 
-def generate_variants(text, seed=None):
-    """
-    Generate two random variants of the input text using variant map.
-    Returns a list of two variant strings.
-    """
-    if not text:
-        return [text, text]
+def edit_distance(a, b):
+    """Levenshtein distance between two (short) strings."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
 
-    variants = []
-    variant_map = load_variant_map()
 
-    # Set seed for reproducibility
-    if seed is not None:
-        random.seed(seed)
+class VariantEngine:
+    """
+    Precompiled variant rules. All rule patterns are combined into one case-insensitive
+    alternation (longest pattern first), so a text is scanned once to find every match site;
+    each variant then only picks one alternative per site.
+    """
 
-    for _ in range(2):
-        var = text
-        for pattern, alternatives in variant_map.items():
-            # Case-insensitive replacement
+    def __init__(self, variant_map):
+        self.alternatives = []
+        self._costs = {}  # (matched text, alternative) -> edit distance
+        branches = []
+        rules = sorted(enumerate(variant_map.items()), key=lambda rule: (-len(rule[1][0]), rule[0]))
+        for _, (pattern, alternatives) in rules:
             try:
-                def replace_match(match):
-                    return random.choice(alternatives)
-
-                var = re.sub(pattern, replace_match, var, flags=re.IGNORECASE)
+                re.compile(pattern)
             except re.error as e:
                 logger.error(f"Invalid regex pattern '{pattern}': {e}")
                 continue
-        variants.append(var)
+            if not alternatives:
+                continue
+            branches.append(f"(?P<r{len(self.alternatives)}>{pattern})")
+            self.alternatives.append(tuple(alternatives))
+        self.pattern = re.compile("|".join(branches), re.IGNORECASE) if branches else None
+
+    @classmethod
+    def from_file(cls, file_path=DEFAULT_VARIANTS_PATH):
+        return cls(load_variant_map(file_path))
+
+    def _matches(self, text):
+        """(start, end, rule index) of every non-empty match site, in one scan."""
+        if self.pattern is None:
+            return
+        for match in self.pattern.finditer(text):
+            if match.start() != match.end():
+                yield match.start(), match.end(), int(match.lastgroup[1:])
+
+    def segments(self, text):
+        """
+        Split text into unchanged strings and match sites in one scan.
+        Match sites are returned as tuples of their alternatives.
+        """
+        parts = []
+        position = 0
+        for start, end, rule in self._matches(text):
+            parts.append(text[position:start])
+            parts.append(self.alternatives[rule])
+            position = end
+        parts.append(text[position:])
+        return parts
+
+    def _cost(self, source, alternative):
+        cost = self._costs.get((source, alternative))
+        if cost is None:
+            cost = self._costs[(source, alternative)] = edit_distance(source, alternative)
+        return cost
+
+    def generate(self, text, num_variants=2, seed=None):
+        """
+        Generate num_variants random variants of text, drawing from a private random.Random(seed)
+        so the global random module is never touched. Returns a list of variant strings.
+        """
+        if not text:
+            return [text] * num_variants
+        rng = random.Random(seed)
+        parts = self.segments(text)
+        return ["".join(part if isinstance(part, str) else rng.choice(part) for part in parts)
+                for _ in range(num_variants)]
+
+    def generate_unique(self, text, num_variants=2, seed=None):
+        """
+        Generate up to num_variants distinct variants of text, none equal to text itself.
+        Every match site is a dimension whose values are its distinct alternatives, so a variant is a
+        number in mixed radix over the sites. OVERSAMPLE * num_variants distinct numbers are sampled
+        without replacement (with a private random.Random(seed)); their variants are ranked by edit
+        distance from text, summed over the sites, and the closest distinct ones are returned. Fewer than
+        num_variants come back only when text has fewer distinct variants.
+        """
+        if not text or num_variants <= 0:
+            return []
+        literals, choices, costs = [], [], []
+        position = 0
+        for start, end, rule in self._matches(text):
+            literals.append(text[position:start])
+            options = tuple(dict.fromkeys(self.alternatives[rule]))
+            choices.append(options)
+            costs.append([self._cost(text[start:end], option) for option in options])
+            position = end
+        literals.append(text[position:])
+        if not choices:
+            return []
 
-    # Reset seed
-    random.seed(None)
-    return variants
+        rng = random.Random(seed)
+        total = math.prod(len(options) for options in choices)
+        wanted = num_variants * OVERSAMPLE
+        if total <= sys.maxsize:
+            numbers = rng.sample(range(total), min(total, wanted))
+        else:
+            # Too many to sample from a range; a repeat among so few draws is vanishingly unlikely
+            numbers = [rng.randrange(total) for _ in range(wanted)]
+
+        candidates = {}  # Variant -> edit distance, in sampling order
+        for number in numbers:
+            parts = [literals[0]]
+            cost = 0
+            for options, site_costs, literal in zip(choices, costs, literals[1:]):
+                number, digit = divmod(number, len(options))
+                parts.append(options[digit])
+                parts.append(literal)
+                cost += site_costs[digit]
+            variant = "".join(parts)
+            if variant != text and variant not in candidates:
+                candidates[variant] = cost
+        return sorted(candidates, key=candidates.get)[:num_variants]  # Stable: ties keep sampling order
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_variant_engine(file_path=DEFAULT_VARIANTS_PATH):
+    """Return the process-wide VariantEngine, loading and compiling the rules on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                with get_metrics().timer("variants.compile"):
+                    _engine = VariantEngine.from_file(file_path)
+    return _engine
+
+
+def variant_seed(prompt, response, run_seed=0):
+    """
+    Seed for the variants of a prompt-response pair: a blake2b digest of the run seed and both texts.
+    Unlike hash(), it is the same in every process and on every run, so variants are reproducible.
+    """
+    data = f"{run_seed}\x1f{prompt}\x1f{response}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def generate_variants(text, num_variants=2, seed=None, mode=None):
+    """
+    Generate variants of the input text using the variant map.
+    Every match site is replaced by one of its alternatives; the same seed gives the same variants.
+    In "unique" mode (mode, default VARIANT_MODE) returns up to num_variants distinct variants other than
+    the text itself; in "random" mode, exactly num_variants independently drawn ones.
+    """
+    mode = mode or VARIANT_MODE
+    if mode not in VARIANT_MODES:
+        raise ValueError(f"Unknown variant mode: {mode}")
+    if mode == "unique":
+        return get_variant_engine().generate_unique(text, num_variants, seed=seed)
+    return get_variant_engine().generate(text, num_variants, seed=seed)
 
 
-def validate_arabizi(text):
+def variant_pairs(prompt, response, num_variants=2, seed=None, mode=None):
     """
-    Basic validation for Arabizi text.
-    Returns True if text contains Arabizi-specific characters, False otherwise.
+    Generate variants of a prompt-response pair, both sides with seed, as (prompt variant, response
+    variant) tuples. In "unique" mode the pairs are distinct and never the pair itself: the side with fewer
+    variants is padded with its own text, so there are fewer than num_variants pairs only when neither
+    side has that many variants. In "random" mode the two sides' variants are paired as drawn.
     """
-    if not text:
-        return False
-    pattern = r'[37shkhgh2]'
-    return bool(re.search(pattern, text, re.IGNORECASE))
\ No newline at end of file
+    prompt_variants = generate_variants(prompt, num_variants, seed, mode)
+    response_variants = generate_variants(response, num_variants, seed, mode)
+    if (mode or VARIANT_MODE) == "unique":
+        count = max(len(prompt_variants), len(response_variants))
+        prompt_variants += [prompt] * (count - len(prompt_variants))
+        response_variants += [response] * (count - len(response_variants))
+    return list(zip(prompt_variants, response_variants))